@@ -11,13 +11,14 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 from datetime import datetime, date
 from src.main import app
 from src.models.user import db
+from src.models.schema import init_db
 from src.models.invoice import Product, Supplier, Invoice, InvoiceLine, PriceHistory
 
 def add_enhanced_sample_data():
     with app.app_context():
         # Clear existing data
         db.drop_all()
-        db.create_all()
+        init_db()  # schéma complet, index de recherche compris
         
         print("Adding enhanced sample data for analytics demo...")
         
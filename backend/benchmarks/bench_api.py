@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+API benchmark suite for the analytics and invoice endpoints
+Run this from the backend directory:
+
+    python3 benchmarks/bench_api.py --scale medium
+    python3 benchmarks/bench_api.py --skip-generate --compare benchmarks/results/<previous>.json
+
+Each endpoint is driven through the Flask test client against a generated
+dataset (see generate_dataset.py). For every endpoint the suite records
+latency percentiles, the number of SQL statements per request, the peak
+Python memory allocated while serving one request and the response size.
+Results are written as JSON so that runs can be compared across commits.
+"""
+
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from generate_dataset import SCALES, generate_dataset
+
+
+def endpoints_for(product_count):
+    """Endpoints to benchmark: a best-selling, a median and a rare product"""
+    popular, median, rare = 1, max(1, product_count // 2), product_count
+    return [
+        ('products-summary', '/api/analytics/products-summary'),
+        ('volatility-report', '/api/analytics/volatility-report'),
+        ('volatility-report-365d', '/api/analytics/volatility-report?days=365'),
+        ('price-evolution-popular', f'/api/analytics/price-evolution/{popular}'),
+        ('price-evolution-median', f'/api/analytics/price-evolution/{median}'),
+        ('price-evolution-rare', f'/api/analytics/price-evolution/{rare}'),
+        ('price-evolution-quarterly', f'/api/analytics/price-evolution/{popular}?granularity=quarterly'),
+        ('price-evolution-daily', f'/api/analytics/price-evolution/{popular}?granularity=daily&max_points=300'),
+        ('price-evolution-window', f'/api/analytics/price-evolution/{popular}?granularity=weekly&from=2024-01-01&to=2024-12-31'),
+        ('supplier-comparison-popular', f'/api/analytics/supplier-comparison/{popular}'),
+        ('price-matrix-category', '/api/analytics/price-matrix?category=Matériaux - Granulats'),
+        ('price-matrix-products', f'/api/analytics/price-matrix?product_ids={popular},{median},{rare}'),
+        ('invoices-first-page', '/api/invoices/invoices?page=1&per_page=10'),
+        ('invoices-deep-page', '/api/invoices/invoices?page=5000&per_page=10'),
+        ('products', '/api/invoices/products'),
+        ('suppliers', '/api/invoices/suppliers'),
+        ('search-common-word', '/api/invoices/search?q=granules'),
+        ('search-prefix', '/api/invoices/search?q=cim'),
+        ('search-rare-reference', f'/api/invoices/search?q={rare:05d}'),
+        ('search-supplier-and-dates', '/api/invoices/search?q=sable&supplier_id=1&from=2023-01-01&to=2023-12-31'),
+    ]
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(app, db, endpoints, iterations, warmup):
+    from sqlalchemy import event
+
+    client = app.test_client()
+    statement_count = [0]
+
+    def count_statement(*args):
+        statement_count[0] += 1
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', count_statement)
+
+    results = {}
+    try:
+        for name, url in endpoints:
+            for _ in range(warmup):
+                client.get(url)
+
+            latencies = []
+            queries = []
+            status = None
+            size = 0
+            for _ in range(iterations):
+                statement_count[0] = 0
+                started = time.perf_counter()
+                response = client.get(url)
+                latencies.append((time.perf_counter() - started) * 1000)
+                queries.append(statement_count[0])
+                status = response.status_code
+                size = len(response.get_data())
+
+            # Memory is measured on a separate request: tracemalloc slows execution down
+            tracemalloc.start()
+            client.get(url)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            results[name] = {
+                'url': url,
+                'status': status,
+                'iterations': iterations,
+                'latency_ms': {
+                    'mean': round(statistics.mean(latencies), 3),
+                    'p50': round(percentile(latencies, 50), 3),
+                    'p90': round(percentile(latencies, 90), 3),
+                    'p99': round(percentile(latencies, 99), 3),
+                    'max': round(max(latencies), 3),
+                },
+                'queries': max(queries),
+                'peak_memory_kb': round(peak / 1024, 1),
+                'response_bytes': size,
+            }
+            print(f"  {name:<30} p50 {results[name]['latency_ms']['p50']:>10.2f} ms  "
+                  f"{results[name]['queries']:>6} queries  {results[name]['peak_memory_kb']:>10.1f} KB")
+    finally:
+        event.remove(engine, 'before_cursor_execute', count_statement)
+
+    return results
+
+
+def compare(current, previous_path):
+    with open(previous_path) as f:
+        previous = json.load(f)
+
+    print(f"\nComparison with {previous_path} (commit {previous.get('commit')}):")
+    for name, result in current['endpoints'].items():
+        before = previous.get('endpoints', {}).get(name)
+        if not before:
+            print(f"  {name:<30} (new)")
+            continue
+        ratio = result['latency_ms']['p50'] / before['latency_ms']['p50'] if before['latency_ms']['p50'] else 0
+        print(f"  {name:<30} p50 x{ratio:>6.2f}  queries {before['queries']} -> {result['queries']}  "
+              f"memory {before['peak_memory_kb']} -> {result['peak_memory_kb']} KB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the API endpoints on a synthetic dataset")
+    parser.add_argument('--database', default=os.path.join(BACKEND_DIR, 'benchmarks', 'data', 'bench.db'))
+    parser.add_argument('--scale', choices=sorted(SCALES), default='small')
+    parser.add_argument('--skip-generate', action='store_true', help="reuse the existing benchmark database")
+    parser.add_argument('--iterations', type=int, default=5)
+    parser.add_argument('--warmup', type=int, default=1)
+    parser.add_argument('--only', help="comma-separated endpoint names to run")
+    parser.add_argument('--output', help="JSON results file (default: benchmarks/results/<date>-<commit>.json)")
+    parser.add_argument('--compare', help="previous JSON results file to compare with")
+    args = parser.parse_args()
+
+    database = os.path.abspath(args.database)
+    dataset = None
+    if not args.skip_generate:
+        print(f"Generating {args.scale} dataset into {database}...")
+        dataset = generate_dataset(database, **SCALES[args.scale])
+        print(f"✅ Dataset loaded in {dataset['duration_seconds']}s")
+
+    # The app must point at the benchmark database before it is imported
+    os.environ['DATABASE_URL'] = f"sqlite:///{database}"
+    from src.main import app
+    from src.models.user import db
+
+    with sqlite3.connect(database) as conn:
+        product_count = conn.execute("SELECT COUNT(*) FROM product").fetchone()[0]
+        row_counts = {
+            table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            for table in ('supplier', 'product', 'invoice', 'invoice_line', 'price_history')
+        }
+
+    endpoints = endpoints_for(product_count)
+    if args.only:
+        selected = set(args.only.split(','))
+        endpoints = [e for e in endpoints if e[0] in selected]
+
+    print(f"Running {len(endpoints)} endpoints x {args.iterations} iterations...")
+    commit = git_commit()
+    results = {
+        'commit': commit,
+        'generated_at': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'scale': None if args.skip_generate else args.scale,
+        'dataset': dataset,
+        'row_counts': row_counts,
+        'endpoints': run_benchmarks(app, db, endpoints, args.iterations, args.warmup),
+    }
+
+    output = args.output or os.path.join(
+        BACKEND_DIR, 'benchmarks', 'results', f"{datetime.now():%Y%m%d-%H%M%S}-{commit or 'nocommit'}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\n✅ Results saved to {output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
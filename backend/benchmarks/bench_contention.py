@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Invoice ingestion latency under concurrent analytics load
+Run this from the backend directory, on a dataset made by generate_dataset.py:
+
+    python3 benchmarks/bench_contention.py --database benchmarks/data/bench.db
+    python3 benchmarks/bench_contention.py --readers 4 --saves 200 --duration 30
+
+The database is copied first, so the dataset is left untouched. Each scenario
+starts reader processes that call the heavy analytics reports in a loop, and
+times /api/invoices/save calls in the main process meanwhile (at least
+--saves calls, for at least --duration seconds). The scenarios are:
+
+- baseline: no readers;
+- shared: the reports read the main database (default mode);
+- snapshot: the reports read the analytics snapshot (ANALYTICS_SNAPSHOT=1),
+  and another process refreshes it every --interval seconds, as the
+  refresh-analytics-snapshot command would from cron.
+
+The interval is kept short so that several refreshes run while the saves are
+timed; their count and duration are reported. With the snapshot, save latency
+should stay close to the baseline, refreshes included.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+REPORTS = (
+    '/api/analytics/volatility-report?days=365',
+    '/api/analytics/products-summary',
+    '/api/analytics/price-matrix?category=Quincaillerie',
+)
+
+
+def configure(database, snapshot):
+    os.environ['DATABASE_URL'] = f"sqlite:///{database}"
+    os.environ['ANALYTICS_SNAPSHOT'] = '1' if snapshot else '0'
+
+
+def reader(database, snapshot, stop, served):
+    configure(database, snapshot)
+    from src.main import create_app
+
+    client = create_app().test_client()
+    i = 0
+    while not stop.is_set():
+        client.get(REPORTS[i % len(REPORTS)])
+        with served.get_lock():
+            served.value += 1
+        i += 1
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def refresher(database, interval, stop, refreshes, slowest):
+    configure(database, True)
+    from src.main import create_app
+    from src.services.snapshot import refresh_snapshot, snapshot_path, source_path
+
+    with create_app().app_context():
+        while not stop.wait(interval):
+            started = time.perf_counter()
+            if refresh_snapshot(source_path(), snapshot_path()):
+                refreshes.value += 1
+                slowest.value = max(slowest.value, time.perf_counter() - started)
+
+
+def run_scenario(name, database, readers, saves, duration, snapshot, interval):
+    configure(database, snapshot)
+    from src.main import create_app
+
+    app = create_app()
+    client = app.test_client()
+    if snapshot:
+        # Snapshot made before the readers start, as a long-running server would have it
+        client.get('/api/analytics/volatility-report')
+
+    stop = multiprocessing.Event()
+    served = multiprocessing.Value('i', 0)
+    refreshes = multiprocessing.Value('i', 0)
+    slowest = multiprocessing.Value('d', 0.0)
+    processes = [multiprocessing.Process(target=reader, args=(database, snapshot, stop, served))
+                 for _ in range(readers)]
+    if snapshot:
+        processes.append(multiprocessing.Process(target=refresher,
+                                                 args=(database, interval, stop, refreshes, slowest)))
+    for process in processes:
+        process.start()
+    time.sleep(2 if readers else 0)  # let the readers get into their report loops
+
+    latencies, errors = [], 0
+    started_at = time.perf_counter()
+    i = 0
+    while i < saves or time.perf_counter() - started_at < duration:
+        payload = {
+            'supplier_name': 'FOURNISSEUR 0001',
+            'invoice_number': f"BENCH-{name}-{i}",
+            'invoice_date': '2024-06-01',
+            'total_amount': 42.0,
+            'lines': [{'raw_description': 'Granulés bois sac 15kg', 'quantity': 2, 'unit_price': 21.0,
+                       'total_price': 42.0, 'product_id': 1}],
+        }
+        started = time.perf_counter()
+        response = client.post('/api/invoices/save', json=payload)
+        latencies.append((time.perf_counter() - started) * 1000)
+        errors += response.status_code != 200
+        i += 1
+
+    stop.set()
+    for process in processes:
+        process.join()
+
+    return {
+        'save_ms': {
+            'p50': round(statistics.median(latencies), 2),
+            'p95': round(percentile(latencies, 95), 2),
+            'max': round(max(latencies), 2),
+        },
+        'saves': len(latencies),
+        'save_errors': errors,
+        'reports_served': served.value,
+        'snapshot_refreshes': refreshes.value,
+        'snapshot_refresh_max_s': round(slowest.value, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure save latency while analytics reports run")
+    parser.add_argument('--database', default=os.path.join(BACKEND_DIR, 'benchmarks', 'data', 'bench.db'))
+    parser.add_argument('--readers', type=int, default=2)
+    parser.add_argument('--saves', type=int, default=100, help="minimum number of saves")
+    parser.add_argument('--duration', type=float, default=15, help="minimum seconds of saves")
+    parser.add_argument('--interval', type=float, default=3, help="snapshot refresh interval (seconds)")
+    parser.add_argument('--output', help="optional JSON results file")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    results = {}
+    try:
+        for name, readers, snapshot in (('baseline', 0, False), ('shared', args.readers, False),
+                                        ('snapshot', args.readers, True)):
+            database = os.path.join(workdir, f"{name}.db")
+            shutil.copyfile(args.database, database)
+            print(f"Running {name} ({readers} readers, {args.saves}+ saves over {args.duration:g}+ s)...")
+            results[name] = run_scenario(name, database, readers, args.saves, args.duration,
+                                         snapshot, args.interval)
+            r = results[name]
+            print(f"  save p50 {r['save_ms']['p50']:8.2f} ms  p95 {r['save_ms']['p95']:8.2f} ms  "
+                  f"max {r['save_ms']['max']:8.2f} ms  saves {r['saves']}  errors {r['save_errors']}  "
+                  f"reports {r['reports_served']}  refreshes {r['snapshot_refreshes']} "
+                  f"(max {r['snapshot_refresh_max_s']:.2f} s)")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\n✅ Results saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,485 @@
+#!/usr/bin/env python3
+"""
+OCR throughput and accuracy benchmark on a rendered invoice corpus
+Run this from the backend directory:
+
+    python3 benchmarks/bench_ocr.py
+    python3 benchmarks/bench_ocr.py --dpi 150,300 --noise 0,2 --compare benchmarks/results/<previous>.json
+    python3 benchmarks/bench_ocr.py --render-only --corpus /tmp/corpus
+
+The corpus is rendered with PIL from a fixed seed, so every run OCRs exactly
+the same pixels: single-page images and multi-page PDFs, at several DPIs and
+noise levels (speckle, blur, skew). Each page comes with its ground truth
+(invoice number, date, lines with their totals).
+
+Documents go through the same path as /api/invoices/upload: content-addressed
+store, page cache (rasterize), then OCR of the cached pages. Three modes are
+measured, each learning from scratch over the corpus in order:
+
+- default: every page read with the default profile (a supplier seen for the
+  first time);
+- profile: pages read with the supplier's OCR profile, refined after each
+  document as /save does (update_profile);
+- template: profile plus layout template (learn_template): once a supplier's
+  zones are confirmed, only those zones are read, with a full read as
+  fallback when they do not parse.
+
+In each mode the supplier is known (header detection is not measured) and
+every document is "validated" with its ground truth before the next one.
+
+For every mode and (format, DPI, noise) group the benchmark reports pages/sec,
+CPU seconds per page (including the tesseract subprocesses), the share of
+pixels OCRed and of documents read by template, and the extraction accuracy:
+invoice number and date hit rates, line recall/precision on totals, and
+character similarity of the full OCR text (template reads only see zones and
+are left out of it). Rasterization is timed separately, once per document.
+Peak RSS is reported for the whole run. An OCR speedup that loses accuracy
+shows up here.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from difflib import SequenceMatcher
+from types import SimpleNamespace
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from PIL import Image, ImageDraw, ImageFilter, ImageFont
+from werkzeug.datastructures import FileStorage
+
+from bench_api import git_commit
+
+A4_INCHES = (8.27, 11.69)
+
+MODES = ('default', 'profile', 'template')
+
+SUPPLIERS = [
+    ("DENIER ENERGIES", "400 ZA les Chalus 04300 FORCALQUIER"),
+    ("GLC MATERIAUX", "Le grand briant quartier beaudine 04300 FORCALQUIER"),
+    ("CRT", "ZA LES CHALUS 04300 FORCALQUIER"),
+]
+
+PRODUCTS = [
+    "Sable broyé 0/2", "Planche coffrage", "Granulés bois", "Gravier 10/20",
+    "Béton mélange", "Ciment gris 35kg", "Parpaing creux 20", "Fioul domestique",
+]
+
+FONT_CANDIDATES = [
+    "DejaVuSans.ttf",
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+    "/Library/Fonts/Arial.ttf",
+    "/System/Library/Fonts/Supplemental/Arial.ttf",
+]
+
+
+def _font(size):
+    for candidate in FONT_CANDIDATES:
+        try:
+            return ImageFont.truetype(candidate, size)
+        except OSError:
+            continue
+    return ImageFont.load_default(size=size)
+
+
+def _format_amount(value):
+    return f"{value:,.2f}".replace(',', ' ').replace('.', ',')
+
+
+def make_invoice_spec(rng, index, line_count):
+    """Ground truth of one synthetic invoice page"""
+    supplier, address = rng.choice(SUPPLIERS)
+    invoice_date = date(2024, 1, 1) + timedelta(days=rng.randrange(365))
+    lines = []
+    for _ in range(line_count):
+        quantity = rng.choice([1, 2, 3, 5, 10, 24])
+        unit_price = round(rng.uniform(1, 150), 2)
+        lines.append({
+            'description': rng.choice(PRODUCTS),
+            'quantity': quantity,
+            'unit_price': unit_price,
+            'total_price': round(quantity * unit_price, 2),
+        })
+    return {
+        'supplier_name': supplier,
+        'supplier_address': address,
+        'invoice_number': f"FAC-2024-{index:04d}",
+        'invoice_date': invoice_date.strftime('%d/%m/%Y'),
+        'lines': lines,
+        'total_amount': round(sum(line['total_price'] for line in lines), 2),
+    }
+
+
+def spec_text(spec):
+    """Expected page text, for the character similarity score"""
+    rows = [
+        spec['supplier_name'],
+        spec['supplier_address'],
+        f"Facture : {spec['invoice_number']}",
+        f"Date : {spec['invoice_date']}",
+        "Désignation Qté P.U. Total",
+    ]
+    for line in spec['lines']:
+        rows.append(f"{line['description']} {line['quantity']} "
+                    f"{_format_amount(line['unit_price'])} € {_format_amount(line['total_price'])} €")
+    rows.append(f"TOTAL TTC {_format_amount(spec['total_amount'])} €")
+    return '\n'.join(rows)
+
+
+def render_page(spec, dpi, noise, rng):
+    """Draws an A4 page at the given resolution, with a noise level from 0 to 3"""
+    width, height = int(A4_INCHES[0] * dpi), int(A4_INCHES[1] * dpi)
+    scale = dpi / 72.0
+    image = Image.new('L', (width, height), 255)
+    draw = ImageDraw.Draw(image)
+    regular, bold = _font(int(10 * scale)), _font(int(14 * scale))
+    margin = int(40 * scale)
+    row = int(16 * scale)
+
+    y = margin
+    draw.text((margin, y), spec['supplier_name'], font=bold, fill=0)
+    y += int(row * 1.4)
+    draw.text((margin, y), spec['supplier_address'], font=regular, fill=0)
+    y += row * 3
+    draw.text((width // 2, y), f"Facture : {spec['invoice_number']}", font=regular, fill=0)
+    y += row
+    draw.text((width // 2, y), f"Date : {spec['invoice_date']}", font=regular, fill=0)
+    y += row * 3
+
+    columns = [margin, int(width * 0.55), int(width * 0.65), int(width * 0.8)]
+    for x, header in zip(columns, ["Désignation", "Qté", "P.U.", "Total"]):
+        draw.text((x, y), header, font=regular, fill=0)
+    y += row
+    draw.line((margin, y, width - margin, y), fill=0, width=max(1, int(scale / 2)))
+    y += row // 2
+    for line in spec['lines']:
+        cells = [line['description'], str(line['quantity']),
+                 f"{_format_amount(line['unit_price'])} €", f"{_format_amount(line['total_price'])} €"]
+        for x, cell in zip(columns, cells):
+            draw.text((x, y), cell, font=regular, fill=0)
+        y += row
+
+    y += row
+    draw.text((columns[2], y), f"TOTAL TTC {_format_amount(spec['total_amount'])} €", font=bold, fill=0)
+
+    if noise:
+        # Scanner speckles, blur and a slight skew
+        pixels = image.load()
+        for _ in range(int(width * height * 0.002 * noise)):
+            pixels[rng.randrange(width), rng.randrange(height)] = rng.choice((0, 128))
+        image = image.filter(ImageFilter.GaussianBlur(radius=0.4 * noise * scale / 4))
+        image = image.rotate(rng.uniform(-0.6, 0.6) * noise, fillcolor=255, expand=False)
+
+    return image
+
+
+def build_corpus(directory, dpis, noises, images_per_group, pdfs_per_group, pages_per_pdf, seed):
+    """Renders the corpus to disk and returns the documents with their ground truth"""
+    os.makedirs(directory, exist_ok=True)
+    rng = random.Random(seed)
+    documents = []
+    index = 0
+    for dpi in dpis:
+        for noise in noises:
+            for kind, count, pages in (('image', images_per_group, 1), ('pdf', pdfs_per_group, pages_per_pdf)):
+                for _ in range(count):
+                    specs = []
+                    images = []
+                    for _ in range(pages):
+                        index += 1
+                        spec = make_invoice_spec(rng, index, rng.randint(4, 12))
+                        specs.append(spec)
+                        images.append(render_page(spec, dpi, noise, rng))
+
+                    extension = 'png' if kind == 'image' else 'pdf'
+                    path = os.path.join(directory, f"{kind}-{dpi}dpi-noise{noise}-{index:04d}.{extension}")
+                    if kind == 'image':
+                        images[0].save(path, dpi=(dpi, dpi))
+                    else:
+                        images[0].save(path, save_all=True, append_images=images[1:], resolution=dpi)
+                    documents.append({'path': path, 'kind': kind, 'dpi': dpi, 'noise': noise, 'pages': specs})
+    return documents
+
+
+def _price_matches(parsed_line, truth_line):
+    return abs(parsed_line['total_price'] - truth_line['total_price']) < 0.005
+
+
+def score_document(parsed, text, specs):
+    """Scores the parsed result of one document against its ground truth (text=None: not scored)"""
+    first = specs[0]
+    truth_lines = [line for spec in specs for line in spec['lines']]
+    remaining = list(parsed['lines'])
+    found = 0
+    for truth in truth_lines:
+        for i, candidate in enumerate(remaining):
+            if _price_matches(candidate, truth):
+                found += 1
+                del remaining[i]
+                break
+
+    expected_text = '\n'.join(spec_text(spec) for spec in specs)
+    return {
+        'invoice_number': parsed['invoice_number'] == first['invoice_number'],
+        'invoice_date': parsed['invoice_date'] == first['invoice_date'],
+        'lines_expected': len(truth_lines),
+        'lines_found': found,
+        'lines_parsed': len(parsed['lines']),
+        'text_similarity': SequenceMatcher(None, text, expected_text, autojunk=False).ratio() if text else None,
+    }
+
+
+def validated_data(document, reference):
+    """What the user validates for a document, as sent to /api/invoices/save"""
+    first = document['pages'][0]
+    return {
+        'file_path': reference,
+        'invoice_number': first['invoice_number'],
+        'invoice_date': datetime.strptime(first['invoice_date'], '%d/%m/%Y').strftime('%Y-%m-%d'),
+        'total_amount': first['total_amount'],
+        'lines': [{'total_price': line['total_price']} for spec in document['pages'] for line in spec['lines']],
+    }
+
+
+def new_supplier():
+    """Stand-in for a Supplier row with nothing learned yet"""
+    return SimpleNamespace(ocr_languages=None, ocr_psm=None, ocr_dpi=None, ocr_preprocess=None, ocr_samples=None,
+                           ocr_english_ratio=None, ocr_mean_confidence=None, layout_template=None)
+
+def _cpu_seconds():
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+
+def _peak_rss_mb():
+    # ru_maxrss is in KiB on Linux and in bytes on macOS
+    divisor = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return round(own / divisor, 1), round(children / divisor, 1)
+
+
+def rasterize_corpus(documents):
+    """Stores and rasterizes every document as /upload does; returns (document, reference, pages) and timings"""
+    from src.services.rasters import rasterize
+    from src.services.storage import store_upload
+
+    rasterized, timings = [], {}
+    for document in documents:
+        key = f"{document['kind']}-{document['dpi']}dpi-noise{document['noise']}"
+        with open(document['path'], 'rb') as f:
+            reference, _ = store_upload(FileStorage(f, os.path.basename(document['path'])),
+                                        document['path'].rsplit('.', 1)[1])
+        started = time.perf_counter()
+        raster_meta = rasterize(reference)
+        timing = timings.setdefault(key, {'pages': 0, 'seconds': 0.0})
+        timing['seconds'] += time.perf_counter() - started
+        timing['pages'] += len(document['pages'])
+        rasterized.append((document, reference, raster_meta))
+    return rasterized, {key: round(t['seconds'] / t['pages'], 3) for key, t in timings.items()}
+
+
+def run_mode(mode, rasterized):
+    """Reads every document in one mode, learning supplier profiles and templates along the way"""
+    from src.routes.invoice import parse_invoice_text, parse_template_zones
+    from src.services.layouts import is_ready, learn_template, load_template, read_zones
+    from src.services.ocr_profiles import DEFAULT_PROFILE, english_ratio, ocr_pages, profile_for, summarize_ocr, update_profile
+    from src.services.rasters import page_paths, save_words
+
+    suppliers = {}
+    groups = {}
+    for document, reference, raster_meta in rasterized:
+        key = f"{mode}/{document['kind']}-{document['dpi']}dpi-noise{document['noise']}"
+        group = groups.setdefault(key, {'documents': 0, 'pages': 0, 'wall': 0.0, 'cpu': 0.0, 'pixels': 0.0,
+                                        'template_reads': 0, 'scores': []})
+        # Templates are learned per page count, as in layouts.learn_template
+        supplier = suppliers.setdefault((document['pages'][0]['supplier_name'], len(document['pages'])), new_supplier())
+        profile = dict(DEFAULT_PROFILE) if mode == 'default' else profile_for(supplier)
+
+        wall_start, cpu_start = time.perf_counter(), _cpu_seconds()
+        parsed, text, pixel_ratio, words = None, None, 0.0, None
+        if mode == 'template':
+            template = load_template(supplier)
+            if is_ready(template, len(raster_meta['pages'])):
+                zones, pixel_ratio = read_zones(template, raster_meta, profile['languages'])
+                parsed = parse_template_zones(zones)
+                if parsed:
+                    zone_text = '\n'.join(zone['text'] for zone in zones.values()) + '\n'
+                    confidences = [zone['confidence'] for zone in zones.values()]
+                    stats = {'confidence': sum(confidences) / len(confidences), 'english_ratio': english_ratio(zone_text)}
+        if parsed is None:
+            texts, confidences, words = [], [], []
+            for page_text, confidence, page_words in ocr_pages(page_paths(raster_meta), profile, raster_meta['dpi']):
+                texts.append(page_text)
+                confidences.append(confidence)
+                words.append(page_words)
+            text = '\n'.join(texts) + '\n'
+            parsed = parse_invoice_text(text)
+            stats = summarize_ocr(text, confidences, profile)
+            pixel_ratio += 1.0
+        group['wall'] += time.perf_counter() - wall_start
+        group['cpu'] += _cpu_seconds() - cpu_start
+
+        # Validation with the ground truth, as /save learns from it
+        if mode != 'default':
+            update_profile(supplier, stats)
+        if mode == 'template' and words is not None:
+            save_words(raster_meta['digest'], words)
+            learn_template(supplier, validated_data(document, reference))
+
+        group['documents'] += 1
+        group['pages'] += len(document['pages'])
+        group['pixels'] += pixel_ratio
+        group['template_reads'] += words is None
+        group['scores'].append(score_document(parsed, text, document['pages']))
+    return groups
+
+
+def summarize_group(group):
+    scores = group['scores']
+    expected = sum(s['lines_expected'] for s in scores)
+    parsed_count = sum(s['lines_parsed'] for s in scores)
+    found = sum(s['lines_found'] for s in scores)
+    similarities = [s['text_similarity'] for s in scores if s['text_similarity'] is not None]
+    return {
+        'documents': group['documents'],
+        'pages': group['pages'],
+        'pages_per_second': round(group['pages'] / group['wall'], 3) if group['wall'] else None,
+        'cpu_seconds_per_page': round(group['cpu'] / group['pages'], 3),
+        'ocr_pixel_ratio': round(group['pixels'] / group['documents'], 3),
+        'template_reads': round(group['template_reads'] / group['documents'], 3),
+        'accuracy': {
+            'invoice_number': round(sum(s['invoice_number'] for s in scores) / len(scores), 3),
+            'invoice_date': round(sum(s['invoice_date'] for s in scores) / len(scores), 3),
+            'line_recall': round(found / expected, 3) if expected else None,
+            'line_precision': round(found / parsed_count, 3) if parsed_count else None,
+            'text_similarity': round(sum(similarities) / len(similarities), 3) if similarities else None,
+        },
+    }
+
+
+def run_benchmark(documents, modes=MODES):
+    rasterized, rasterize_seconds = rasterize_corpus(documents)
+    for key, seconds in rasterize_seconds.items():
+        print(f"  rasterize {key:<28} {seconds:>6} s/page")
+
+    results = {}
+    for mode in modes:
+        for key, group in run_mode(mode, rasterized).items():
+            results[key] = summarize_group(group)
+            print(f"  {key:<37} {results[key]['pages_per_second']:>7} pages/s  "
+                  f"{results[key]['cpu_seconds_per_page']:>6} cpu s/page  "
+                  f"pixels {results[key]['ocr_pixel_ratio']}  "
+                  f"template {results[key]['template_reads']}  "
+                  f"recall {results[key]['accuracy']['line_recall']}  "
+                  f"text {results[key]['accuracy']['text_similarity']}")
+    return results, rasterize_seconds
+
+
+def compare(current, previous_path):
+    with open(previous_path) as f:
+        previous = json.load(f)
+
+    print(f"\nComparison with {previous_path} (commit {previous.get('commit')}):")
+    for key, result in current['groups'].items():
+        before = previous.get('groups', {}).get(key)
+        if not before:
+            print(f"  {key:<37} (new)")
+            continue
+        speedup = (result['pages_per_second'] or 0) / before['pages_per_second'] if before['pages_per_second'] else 0
+        deltas = ', '.join(
+            f"{field} {before['accuracy'][field]} -> {value}"
+            for field, value in result['accuracy'].items()
+            if value != before['accuracy'].get(field)
+        )
+        print(f"  {key:<37} x{speedup:>5.2f} pages/s  {deltas or 'accuracy unchanged'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark OCR throughput and accuracy on a rendered corpus")
+    parser.add_argument('--corpus', default=os.path.join(BACKEND_DIR, 'benchmarks', 'data', 'ocr_corpus'))
+    parser.add_argument('--dpi', default='150,200,300', help="comma-separated render resolutions")
+    parser.add_argument('--noise', default='0,1,2', help="comma-separated noise levels (0-3)")
+    parser.add_argument('--images', type=int, default=3, help="single-page images per group")
+    parser.add_argument('--pdfs', type=int, default=1, help="multi-page PDFs per group")
+    parser.add_argument('--pages-per-pdf', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--modes', default=','.join(MODES), help="comma-separated pipelines: " + ', '.join(MODES))
+    parser.add_argument('--render-only', action='store_true', help="only render the corpus")
+    parser.add_argument('--output', help="JSON results file (default: benchmarks/results/ocr-<date>-<commit>.json)")
+    parser.add_argument('--compare', help="previous JSON results file to compare with")
+    args = parser.parse_args()
+
+    dpis = [int(value) for value in args.dpi.split(',')]
+    noises = [int(value) for value in args.noise.split(',')]
+    modes = args.modes.split(',')
+    if any(mode not in MODES for mode in modes):
+        parser.error(f"--modes must be among {', '.join(MODES)}")
+
+    started = time.perf_counter()
+    documents = build_corpus(args.corpus, dpis, noises, args.images, args.pdfs, args.pages_per_pdf, args.seed)
+    pages = sum(len(d['pages']) for d in documents)
+    print(f"✅ Rendered {len(documents)} documents ({pages} pages) into {args.corpus} "
+          f"in {time.perf_counter() - started:.1f}s")
+    with open(os.path.join(args.corpus, 'ground_truth.json'), 'w') as f:
+        json.dump(documents, f, indent=2, ensure_ascii=False)
+    if args.render_only:
+        return
+
+    # Without tesseract every page would fail: refuse to measure that
+    import pytesseract
+    try:
+        pytesseract.get_tesseract_version()
+    except pytesseract.TesseractNotFoundError:
+        parser.error("tesseract is not installed or not in PATH")
+
+    from src.main import create_app
+
+    # Fresh upload store: every run rasterizes and learns from scratch
+    upload_folder = tempfile.mkdtemp(prefix='bench-ocr-')
+    app = create_app({'UPLOAD_FOLDER': upload_folder})
+    print(f"Running OCR on {pages} pages, modes {', '.join(modes)}...")
+    try:
+        with app.app_context():
+            groups, rasterize_seconds = run_benchmark(documents, modes)
+    finally:
+        shutil.rmtree(upload_folder, ignore_errors=True)
+
+    own_rss, child_rss = _peak_rss_mb()
+    commit = git_commit()
+    results = {
+        'commit': commit,
+        'generated_at': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'corpus': {'seed': args.seed, 'dpis': dpis, 'noises': noises, 'documents': len(documents), 'pages': pages},
+        'modes': modes,
+        'rasterize_seconds_per_page': rasterize_seconds,
+        'peak_rss_mb': {'process': own_rss, 'largest_child': child_rss},
+        'groups': groups,
+    }
+
+    output = args.output or os.path.join(
+        BACKEND_DIR, 'benchmarks', 'results', f"ocr-{datetime.now():%Y%m%d-%H%M%S}-{commit or 'nocommit'}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\n✅ Results saved to {output}")
+    print(f"Peak RSS: {own_rss} MB (process), {child_rss} MB (largest child process)")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
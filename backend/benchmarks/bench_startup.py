@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Worker cold-start benchmark and regression guard
+Run this from the backend directory:
+
+    python3 benchmarks/bench_startup.py
+    python3 benchmarks/bench_startup.py --max-import-ms 800 --runs 10
+
+Each run starts a fresh interpreter with `python -X importtime`, imports
+src.main (which builds the app through create_app()), then serves one
+analytics request through the test client. The script reports the import
+time of src.main, the time to the first response and the heaviest modules.
+
+It exits with status 1 when a budget is exceeded or when one of the lazily
+loaded OCR dependencies (pytesseract, pdf2image, PIL) is imported at startup,
+so it can run as a CI check.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+LAZY_MODULES = ('pytesseract', 'pdf2image', 'PIL')
+
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import src.main
+imported = time.perf_counter()
+client = src.main.app.test_client()
+status = client.get(sys.argv[1]).status_code
+answered = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'first_response_ms': (answered - started) * 1000,
+    'status': status,
+    'loaded': sorted(m for m in sys.modules if m.split('.')[0] in %r),
+}))
+""" % (LAZY_MODULES,)
+
+
+def parse_importtime(stderr):
+    """Returns {module: (self_us, cumulative_us)} from `-X importtime` output"""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        modules[name.strip()] = (int(self_us), int(cumulative_us))
+    return modules
+
+
+def run_once(url, database):
+    env = dict(os.environ, DATABASE_URL=database)
+    process = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', PROBE, url],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True
+    )
+    result = json.loads(process.stdout.strip().splitlines()[-1])
+    result['modules'] = parse_importtime(process.stderr)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure and guard the worker cold-start time")
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--url', default='/api/analytics/volatility-report')
+    parser.add_argument('--database', help="database URL used by the probe (default: fresh empty database)")
+    parser.add_argument('--max-import-ms', type=float, help="fail if the median import time exceeds this budget")
+    parser.add_argument('--max-first-response-ms', type=float,
+                        help="fail if the median time to the first response exceeds this budget")
+    parser.add_argument('--top', type=int, default=10, help="number of heaviest modules to show")
+    parser.add_argument('--output', help="optional JSON results file")
+    args = parser.parse_args()
+
+    database = args.database
+    if database is None:
+        # Schema creation is not part of startup any more: prepare it once, outside the timings
+        database = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'startup.db')}"
+        subprocess.run(
+            [sys.executable, '-m', 'flask', '--app', 'src.main', 'init-db'],
+            cwd=BACKEND_DIR, env=dict(os.environ, DATABASE_URL=database), check=True, capture_output=True
+        )
+
+    runs = [run_once(args.url, database) for _ in range(args.runs)]
+    import_ms = statistics.median(r['import_ms'] for r in runs)
+    first_response_ms = statistics.median(r['first_response_ms'] for r in runs)
+    loaded = sorted({m for r in runs for m in r['loaded']})
+
+    print(f"src.main import:      {import_ms:8.1f} ms (median of {args.runs})")
+    print(f"first response:       {first_response_ms:8.1f} ms ({args.url} -> {runs[-1]['status']})")
+    print("\nHeaviest modules by self time (last run):")
+    modules = {name.strip(): times for name, times in runs[-1]['modules'].items()}
+    heaviest = sorted(modules.items(), key=lambda item: -item[1][0])[:args.top]
+    for name, (self_us, cumulative_us) in heaviest:
+        print(f"  {self_us / 1000:8.1f} ms self  {cumulative_us / 1000:8.1f} ms cumulative  {name}")
+
+    failures = []
+    if loaded:
+        failures.append(f"lazy OCR dependencies imported at startup: {', '.join(loaded)}")
+    if args.max_import_ms is not None and import_ms > args.max_import_ms:
+        failures.append(f"import time {import_ms:.1f} ms exceeds budget {args.max_import_ms} ms")
+    if args.max_first_response_ms is not None and first_response_ms > args.max_first_response_ms:
+        failures.append(f"first response {first_response_ms:.1f} ms exceeds budget {args.max_first_response_ms} ms")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'import_ms': import_ms,
+                'first_response_ms': first_response_ms,
+                'lazy_modules_loaded': loaded,
+                'heaviest_modules_self_ms': {name: self_us / 1000 for name, (self_us, _) in heaviest},
+            }, f, indent=2)
+
+    if failures:
+        for failure in failures:
+            print(f"\n❌ {failure}")
+        sys.exit(1)
+    print("\n✅ Startup within budget")
+
+
+if __name__ == "__main__":
+    main()
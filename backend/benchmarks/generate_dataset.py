@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Synthetic dataset generator for analytics and API benchmarks
+Run this from the backend directory:
+
+    python3 benchmarks/generate_dataset.py --scale medium --output benchmarks/data/bench.db
+
+Unlike add_enhanced_sample_data.py, this never touches src/database/app.db by
+default. Rows are bulk-loaded with executemany() on a raw sqlite3 connection
+(journal and fsync disabled), so millions of rows load in seconds.
+
+Distributions:
+- supplier and product popularity follow a Zipf law (a few big suppliers and
+  best-selling products, a long tail of rare ones);
+- each product has a log-normal base price, a yearly drift and its own
+  volatility; each supplier applies a small price factor to it;
+- invoice dates are uniform over the period, the number of lines per invoice
+  is geometric around the requested mean, quantities are log-normal;
+- about 10% of lines are left unmatched (no product, no price history), as in
+  a real validation backlog.
+"""
+
+import argparse
+import math
+import os
+import random
+import sqlite3
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.services.search import REBUILD_SEARCH_INDEX, SEARCH_SCHEMA
+
+SCALES = {
+    'small': {'suppliers': 20, 'products': 500, 'invoices': 20000, 'lines_per_invoice': 5},
+    'medium': {'suppliers': 50, 'products': 2000, 'invoices': 200000, 'lines_per_invoice': 6},
+    'large': {'suppliers': 200, 'products': 10000, 'invoices': 1000000, 'lines_per_invoice': 8},
+}
+
+CATEGORIES = [
+    ("Matériaux - Granulats", "Tonne"),
+    ("Matériaux - Béton", "Tonne"),
+    ("Bois - Construction", "ML"),
+    ("Énergie - Chauffage", "Sac"),
+    ("Énergie - Carburant", "Litre"),
+    ("Quincaillerie", "Pièce"),
+    ("Outillage", "Pièce"),
+    ("Plomberie", "Pièce"),
+]
+
+PRODUCT_WORDS = [
+    "Sable", "Gravier", "Planche", "Granulés", "Béton", "Ciment", "Parpaing",
+    "Fioul", "Gasoil", "Vis", "Cheville", "Tube", "Raccord", "Chevron", "Madrier",
+]
+
+BATCH_SIZE = 50000
+UNMATCHED_LINE_RATE = 0.1
+
+
+def _zipf_cum_weights(n, exponent=1.1):
+    total = 0.0
+    cum_weights = []
+    for rank in range(1, n + 1):
+        total += 1.0 / rank ** exponent
+        cum_weights.append(total)
+    return cum_weights
+
+
+def _create_schema(db_path):
+    # Schema comes from the SQLAlchemy models, without importing src.main
+    from sqlalchemy import create_engine
+    from src.models.user import db
+    import src.models.invoice  # noqa: F401 (registers the tables)
+
+    engine = create_engine(f"sqlite:///{db_path}")
+    db.metadata.drop_all(engine)
+    db.metadata.create_all(engine)
+    engine.dispose()
+
+
+def generate_dataset(db_path, suppliers=50, products=2000, invoices=200000,
+                     lines_per_invoice=6, years=5, end_date=None, seed=42):
+    """Creates a fresh database at db_path and bulk-loads a synthetic dataset.
+
+    Returns a dict of row counts and the load duration.
+    """
+    rng = random.Random(seed)
+    end_date = end_date or date.today()
+    start_date = end_date - timedelta(days=int(365 * years))
+    span_days = (end_date - start_date).days
+
+    os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    _create_schema(db_path)
+
+    started = time.perf_counter()
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode = OFF")
+    conn.execute("PRAGMA synchronous = OFF")
+    now = datetime.utcnow().isoformat(sep=' ')
+
+    # Suppliers
+    conn.executemany(
+        "INSERT INTO supplier (id, name, address, contact_info, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+        (
+            (i, f"FOURNISSEUR {i:04d}", f"ZA des Chalus {i} 04300 FORCALQUIER", f"04 92 {i % 100:02d} 00 00", now, now)
+            for i in range(1, suppliers + 1)
+        )
+    )
+
+    # Products and their price model
+    product_params = []
+    product_rows = []
+    for i in range(1, products + 1):
+        category, unit = CATEGORIES[rng.randrange(len(CATEGORIES))]
+        name = f"{rng.choice(PRODUCT_WORDS)} {i:05d}"
+        product_rows.append((i, name, category, unit, now, now))
+        product_params.append((
+            math.exp(rng.gauss(math.log(20), 1.2)),  # base price
+            rng.gauss(0.03, 0.05),                   # yearly drift
+            rng.uniform(0.02, 0.15),                 # volatility
+        ))
+    conn.executemany(
+        "INSERT INTO product (id, name, category, unit, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+        product_rows
+    )
+
+    # Supplier catalogs: popular products are sold by most suppliers
+    product_ids = list(range(1, products + 1))
+    product_cum_weights = _zipf_cum_weights(products)
+    catalogs = []
+    for _ in range(suppliers):
+        size = max(1, min(products, int(rng.expovariate(1.0 / max(1, products // 10)))))
+        catalog = sorted(set(rng.choices(product_ids, cum_weights=product_cum_weights, k=size)))
+        catalogs.append((catalog, _zipf_cum_weights(len(catalog)), rng.gauss(1.0, 0.08)))
+
+    supplier_ids = list(range(1, suppliers + 1))
+    supplier_cum_weights = _zipf_cum_weights(suppliers)
+    line_stop_probability = 1.0 / max(1, lines_per_invoice)
+
+    invoice_rows, line_rows, history_rows = [], [], []
+    counts = {'suppliers': suppliers, 'products': products, 'invoices': 0, 'invoice_lines': 0, 'price_history': 0}
+    line_id = 0
+
+    def flush():
+        conn.executemany(
+            "INSERT INTO invoice (id, invoice_number, invoice_date, supplier_id, total_amount, currency, "
+            "status, ocr_confidence, file_path, created_at) VALUES (?, ?, ?, ?, ?, 'EUR', 'validated', ?, NULL, ?)",
+            invoice_rows
+        )
+        conn.executemany(
+            "INSERT INTO invoice_line (id, invoice_id, product_id, raw_description, quantity, unit_price, "
+            "total_price, validation_status, validated_by, validated_at, ocr_confidence, "
+            "product_match_confidence, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, 'validated', 'generator', ?, ?, ?, ?)",
+            line_rows
+        )
+        conn.executemany(
+            "INSERT INTO price_history (product_id, supplier_id, invoice_line_id, price, quantity, unit_price, "
+            "date, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            history_rows
+        )
+        counts['invoices'] += len(invoice_rows)
+        counts['invoice_lines'] += len(line_rows)
+        counts['price_history'] += len(history_rows)
+        invoice_rows.clear()
+        line_rows.clear()
+        history_rows.clear()
+
+    # Sorted dates so ids grow with time, as in production
+    offsets = sorted(rng.randrange(span_days + 1) for _ in range(invoices))
+    for invoice_id, offset in enumerate(offsets, start=1):
+        invoice_date = start_date + timedelta(days=offset)
+        iso_date = invoice_date.isoformat()
+        elapsed_years = offset / 365.0
+        supplier_id = rng.choices(supplier_ids, cum_weights=supplier_cum_weights)[0]
+        catalog, catalog_cum_weights, supplier_factor = catalogs[supplier_id - 1]
+
+        line_count = 1
+        while rng.random() > line_stop_probability and line_count < 50:
+            line_count += 1
+
+        invoice_total = 0.0
+        for product_id in rng.choices(catalog, cum_weights=catalog_cum_weights, k=line_count):
+            base_price, drift, volatility = product_params[product_id - 1]
+            unit_price = max(0.01, round(
+                base_price * supplier_factor * (1 + drift) ** elapsed_years * math.exp(rng.gauss(0, volatility)), 2
+            ))
+            quantity = round(math.exp(rng.gauss(1.5, 1.0)), 2)
+            total_price = round(unit_price * quantity, 2)
+            invoice_total += total_price
+
+            line_id += 1
+            matched = rng.random() >= UNMATCHED_LINE_RATE
+            line_rows.append((
+                line_id, invoice_id, product_id if matched else None,
+                f"{product_rows[product_id - 1][1]} ref {rng.randrange(1000, 9999)}",
+                quantity, unit_price, total_price, now,
+                round(rng.uniform(0.6, 0.99), 2), round(rng.uniform(0.5, 1.0), 2) if matched else None, now
+            ))
+            if matched:
+                history_rows.append((product_id, supplier_id, line_id, total_price, quantity, unit_price, iso_date, now))
+
+        invoice_rows.append((
+            invoice_id, f"FAC-{invoice_id:08d}", iso_date, supplier_id,
+            round(invoice_total, 2), round(rng.uniform(0.6, 0.99), 2), now
+        ))
+
+        if len(line_rows) >= BATCH_SIZE:
+            flush()
+
+    flush()
+
+    # Full-text index built once after the bulk load (cheaper than firing triggers row by row)
+    for table in ('invoice_line_fts', 'invoice_fts'):
+        conn.execute(f"DROP TABLE IF EXISTS {table}")
+    for statement in SEARCH_SCHEMA + REBUILD_SEARCH_INDEX:
+        conn.execute(statement)
+
+    conn.commit()
+    conn.close()
+
+    counts['duration_seconds'] = round(time.perf_counter() - started, 2)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic invoice dataset")
+    parser.add_argument('--output', default=os.path.join('benchmarks', 'data', 'bench.db'))
+    parser.add_argument('--scale', choices=sorted(SCALES), default='small')
+    parser.add_argument('--suppliers', type=int)
+    parser.add_argument('--products', type=int)
+    parser.add_argument('--invoices', type=int)
+    parser.add_argument('--lines-per-invoice', type=int)
+    parser.add_argument('--years', type=float, default=5)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    params = dict(SCALES[args.scale])
+    for key in params:
+        value = getattr(args, key)
+        if value is not None:
+            params[key] = value
+
+    print(f"Generating {args.scale} dataset into {args.output}...")
+    counts = generate_dataset(args.output, years=args.years, seed=args.seed, **params)
+    rows = sum(v for k, v in counts.items() if k != 'duration_seconds')
+    print(f"✅ {rows} rows loaded in {counts['duration_seconds']}s")
+    for key, value in counts.items():
+        print(f"  {key}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+"""
+Recompress old invoice scans in the content-addressed upload store
+Run this from the backend directory: python3 compress_old_uploads.py [max_age_days]
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from src.main import app
+from src.services.storage import compress_old_objects
+from src.services.rasters import purge_old_rasters
+
+def compress_old_uploads(max_age_days):
+    with app.app_context():
+        print(f"Compressing uploads older than {max_age_days} days...")
+        stats = compress_old_objects(max_age_days=max_age_days)
+
+        saved = stats['bytes_before'] - stats['bytes_after']
+        print(f"✅ {stats['compressed']} files compressed, {stats['skipped']} skipped")
+        print(f"Saved {saved / 1024:.1f} KB")
+        print(f"Purged {stats['cache_purged']} decompressed cache entries")
+        print(f"Purged {purge_old_rasters(max_age_days)} page raster caches")
+
+if __name__ == "__main__":
+    compress_old_uploads(int(sys.argv[1]) if len(sys.argv) > 1 else 90)
@@ -3,48 +3,107 @@ import sys
 # DON'T CHANGE THIS !!!
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
-from flask import Flask, send_from_directory
+from flask import Flask, jsonify, request, send_from_directory
 from src.models.user import db
-from src.models.invoice import Product, Supplier, Invoice, InvoiceLine, PriceHistory
+from src.models.schema import init_db, schema_lag
 from src.routes.user import user_bp
 from src.routes.invoice import invoice_bp
 from src.routes.analytics import analytics_bp
+from src.routes.metrics import metrics_bp
+from src.services import metrics, snapshot
 from flask_cors import CORS
+from sqlalchemy import event
 
 
-app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
-app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT'
-
-# Enable CORS for all routes
-CORS(app)
-
-app.register_blueprint(user_bp, url_prefix='/api')
-app.register_blueprint(invoice_bp, url_prefix='/api/invoices')
-app.register_blueprint(analytics_bp, url_prefix='/api/analytics')
-
-# uncomment if you need to use database
-app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db.init_app(app)
-with app.app_context():
-    db.create_all()
-
-@app.route('/', defaults={'path': ''})
-@app.route('/<path:path>')
-def serve(path):
-    static_folder_path = app.static_folder
-    if static_folder_path is None:
-            return "Static folder not configured", 404
-
-    if path != "" and os.path.exists(os.path.join(static_folder_path, path)):
-        return send_from_directory(static_folder_path, path)
-    else:
-        index_path = os.path.join(static_folder_path, 'index.html')
-        if os.path.exists(index_path):
-            return send_from_directory(static_folder_path, 'index.html')
+def _use_wal(dbapi_connection, connection_record):
+    """Journal WAL (persistant dans le fichier) : les lectures ne bloquent plus les écritures, et inversement"""
+    dbapi_connection.execute('PRAGMA journal_mode=WAL')
+
+
+def create_app(config=None):
+    """Construit l'application Flask.
+
+    Aucun travail lourd ici : les dépendances OCR sont chargées à la première
+    utilisation et le schéma est créé par la commande ``init-db``.
+    """
+    app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
+    app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT'
+
+    # Enable CORS for all routes
+    CORS(app)
+
+    app.register_blueprint(user_bp, url_prefix='/api')
+    app.register_blueprint(invoice_bp, url_prefix='/api/invoices')
+    app.register_blueprint(analytics_bp, url_prefix='/api/analytics')
+    app.register_blueprint(metrics_bp, url_prefix='/api')
+
+    # uncomment if you need to use database
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}")
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    # Journalise les requêtes plus lentes que ce seuil (en secondes), désactivé si absent
+    app.config['SLOW_REQUEST_THRESHOLD'] = os.environ.get('SLOW_REQUEST_THRESHOLD')
+    # Stockage des fichiers uploadés (adressé par contenu, voir src/services/storage.py)
+    app.config['UPLOAD_FOLDER'] = os.environ.get('UPLOAD_FOLDER', os.path.join(os.path.dirname(os.path.dirname(__file__)), 'uploads'))
+    # Rapports d'analyse servis par une copie de la base rafraîchie périodiquement (voir src/services/snapshot.py)
+    app.config['ANALYTICS_SNAPSHOT'] = os.environ.get('ANALYTICS_SNAPSHOT', '').lower() in ('1', 'true', 'yes')
+    app.config['ANALYTICS_SNAPSHOT_INTERVAL'] = float(os.environ.get('ANALYTICS_SNAPSHOT_INTERVAL', 300))
+    app.config['ANALYTICS_SNAPSHOT_PATH'] = os.environ.get('ANALYTICS_SNAPSHOT_PATH')
+    if config:
+        app.config.update(config)
+
+    db.init_app(app)
+    with app.app_context():
+        # La copie d'analyse en une seule étape (voir src/services/snapshot.py) suppose le journal WAL
+        if app.config['ANALYTICS_SNAPSHOT'] and db.engine.dialect.name == 'sqlite':
+            event.listen(db.engine, 'connect', _use_wal)
+    metrics.init_app(app)
+    snapshot.init_app(app)
+
+    @app.before_request
+    def check_schema():
+        """Refuse les appels d'API tant que la base n'a pas le schéma des modèles (vérifié une fois par processus)"""
+        if app.extensions.get('schema_checked') or not request.path.startswith('/api'):
+            return None
+        lag = schema_lag()
+        if lag:
+            message = f"Schéma de la base en retard ({', '.join(lag)}) : lancer `flask --app src.main init-db`"
+            app.logger.error(message)
+            return jsonify({'error': message}), 503
+        app.extensions['schema_checked'] = True
+        return None
+
+    @app.cli.command('init-db')
+    def init_db_command():
+        """Crée le schéma de la base de données"""
+        added = init_db()
+        for item in added:
+            print(f"Ajouté au schéma: {item}")
+        print("Base de données initialisée")
+
+    @app.route('/', defaults={'path': ''})
+    @app.route('/<path:path>')
+    def serve(path):
+        static_folder_path = app.static_folder
+        if static_folder_path is None:
+                return "Static folder not configured", 404
+
+        if path != "" and os.path.exists(os.path.join(static_folder_path, path)):
+            return send_from_directory(static_folder_path, path)
         else:
-            return "index.html not found", 404
+            index_path = os.path.join(static_folder_path, 'index.html')
+            if os.path.exists(index_path):
+                return send_from_directory(static_folder_path, 'index.html')
+            else:
+                return "index.html not found", 404
+
+    return app
+
+
+app = create_app()
 
 
 if __name__ == '__main__':
+    # Serveur de développement : on garde la création automatique du schéma
+    with app.app_context():
+        init_db()
     app.run(host='0.0.0.0', port=8000, debug=True)
@@ -1,5 +1,6 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime, date
+from sqlalchemy import event, inspect
 from src.models.user import db
 
 class Product(db.Model):
@@ -8,6 +9,7 @@ class Product(db.Model):
     category = db.Column(db.String(100), nullable=True)
     unit = db.Column(db.String(50), nullable=True)  # kg, pièce, litre, etc.
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)  # Synchronisation des catalogues (?since=)
     
     # Relations
     invoice_lines = db.relationship('InvoiceLine', backref='product', lazy=True)
@@ -21,7 +23,8 @@ class Product(db.Model):
             'name': self.name,
             'category': self.category,
             'unit': self.unit,
-            'created_at': self.created_at.isoformat() if self.created_at else None
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
 
 class Supplier(db.Model):
@@ -30,6 +33,17 @@ class Supplier(db.Model):
     address = db.Column(db.Text, nullable=True)
     contact_info = db.Column(db.String(200), nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)  # Synchronisation des catalogues (?since=), voir _touch_supplier
+    
+    # Profil OCR appris sur les factures validées (None = réglage par défaut)
+    ocr_languages = db.Column(db.String(50), nullable=True)  # fra, fra+eng...
+    ocr_psm = db.Column(db.Integer, nullable=True)  # Mode de segmentation Tesseract
+    ocr_dpi = db.Column(db.Integer, nullable=True)
+    ocr_preprocess = db.Column(db.String(50), nullable=True)  # none, grayscale, binarize
+    ocr_samples = db.Column(db.Integer, nullable=True)  # Factures validées prises en compte
+    ocr_english_ratio = db.Column(db.Float, nullable=True)  # Part de mots anglais observée
+    ocr_mean_confidence = db.Column(db.Float, nullable=True)  # Confiance OCR moyenne observée
+    layout_template = db.Column(db.Text, nullable=True)  # Zones des champs en JSON (voir services/layouts.py)
     
     # Relations
     invoices = db.relationship('Invoice', backref='supplier', lazy=True)
@@ -37,15 +51,37 @@ class Supplier(db.Model):
     def __repr__(self):
         return f'<Supplier {self.name}>'
     
+    def ocr_profile_to_dict(self):
+        return {
+            'languages': self.ocr_languages,
+            'psm': self.ocr_psm,
+            'dpi': self.ocr_dpi,
+            'preprocess': self.ocr_preprocess,
+            'samples': self.ocr_samples or 0,
+            'english_ratio': self.ocr_english_ratio,
+            'mean_confidence': self.ocr_mean_confidence
+        }
+    
     def to_dict(self):
         return {
             'id': self.id,
             'name': self.name,
             'address': self.address,
             'contact_info': self.contact_info,
-            'created_at': self.created_at.isoformat() if self.created_at else None
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
 
+# Champs du fournisseur servis par le catalogue (Supplier.to_dict)
+SUPPLIER_CATALOG_COLUMNS = ('name', 'address', 'contact_info')
+
+@event.listens_for(Supplier, 'before_update')
+def _touch_supplier(mapper, connection, supplier):
+    """Met à jour updated_at si un champ du catalogue change (pas pour le profil OCR ni le gabarit, appris à chaque /save)"""
+    state = inspect(supplier)
+    if any(state.attrs[name].history.has_changes() for name in SUPPLIER_CATALOG_COLUMNS):
+        supplier.updated_at = datetime.utcnow()
+
 class Invoice(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     invoice_number = db.Column(db.String(100), nullable=False)
@@ -56,6 +92,7 @@ class Invoice(db.Model):
     status = db.Column(db.String(50), default='pending')  # pending, validated, processed
     ocr_confidence = db.Column(db.Float, nullable=True)  # Score de confiance global OCR
     file_path = db.Column(db.String(500), nullable=True)  # Chemin vers le fichier original
+    ocr_text = db.Column(db.Text, nullable=True)  # Texte OCR extrait, indexé pour la recherche
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Relations
@@ -137,6 +174,11 @@ class PriceHistory(db.Model):
     
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    # Index couvrant des séries de prix par produit : agrégation par période sans lire la table
+    __table_args__ = (
+        db.Index('ix_price_history_product_date', 'product_id', 'date', 'supplier_id', 'unit_price', 'quantity'),
+    )
+    
     # Relations
     product = db.relationship('Product', backref='price_history')
     supplier = db.relationship('Supplier', backref='price_history')
@@ -0,0 +1,97 @@
+from sqlalchemy import inspect, text
+
+from src.models.user import db
+import src.models.invoice  # noqa: F401 (enregistre les tables auprès de db.metadata)
+from src.services.search import create_search_index
+
+def missing_columns():
+    """Colonnes des modèles absentes des tables existantes, sous forme de (table, colonne)"""
+    inspector = inspect(db.engine)
+    existing_tables = set(inspector.get_table_names())
+    missing = []
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+        missing.extend((table, column) for column in table.columns if column.name not in existing_columns)
+    return missing
+
+def missing_indexes():
+    """Index déclarés dans les modèles absents des tables existantes, sous forme de (table, index)"""
+    inspector = inspect(db.engine)
+    existing_tables = set(inspector.get_table_names())
+    missing = []
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing_indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+        missing.extend((table, index) for index in table.indexes if index.name not in existing_indexes)
+    return missing
+
+def schema_lag():
+    """Éléments des modèles absents de la base (tables, colonnes, index).
+
+    Liste vide quand la base est à jour ; sinon ``flask --app src.main init-db``
+    doit être lancé avant de servir des requêtes.
+    """
+    existing_tables = set(inspect(db.engine).get_table_names())
+    lag = [table.name for table in db.metadata.sorted_tables if table.name not in existing_tables]
+    lag += [f"{table.name}.{column.name}" for table, column in missing_columns()]
+    lag += [f"{table.name}.{index.name} (index)" for table, index in missing_indexes()]
+    return lag
+
+def add_missing_columns():
+    """Ajoute aux tables existantes les colonnes nullables apparues dans les modèles.
+
+    db.create_all() ne modifie pas une table déjà créée : sans cette étape, une
+    base existante n'aurait pas les nouvelles colonnes. Retourne la liste des
+    colonnes ajoutées, sous la forme "table.colonne".
+    """
+    added = []
+    for table, column in missing_columns():
+        if not column.nullable:
+            continue
+        column_type = column.type.compile(dialect=db.engine.dialect)
+        db.session.execute(text(f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type}'))
+        added.append(f"{table.name}.{column.name}")
+    db.session.commit()
+    return added
+
+def add_missing_indexes():
+    """Crée sur les tables existantes les index déclarés dans les modèles.
+
+    Comme pour les colonnes, db.create_all() ne les ajoute pas à une table qui
+    existe déjà. Retourne la liste des index créés, sous la forme "table.index (index)".
+    """
+    created = []
+    for table, index in missing_indexes():
+        index.create(db.engine)
+        created.append(f"{table.name}.{index.name} (index)")
+    return created
+
+def backfill_updated_at():
+    """Renseigne updated_at sur les lignes antérieures à la colonne (date de création à défaut).
+
+    Sans valeur, ces lignes n'apparaîtraient jamais dans une synchronisation par ``?since=``.
+    """
+    for table in db.metadata.sorted_tables:
+        if 'updated_at' in table.columns and 'created_at' in table.columns:
+            db.session.execute(text(
+                f'UPDATE "{table.name}" SET updated_at = COALESCE(created_at, CURRENT_TIMESTAMP) WHERE updated_at IS NULL'
+            ))
+    db.session.commit()
+
+def init_db():
+    """Crée les tables manquantes et complète les tables existantes.
+
+    Étape explicite (``flask --app src.main init-db``) : les workers ne touchent
+    plus au schéma à chaque démarrage. À relancer après une mise à jour qui
+    ajoute des colonnes. Crée aussi l'index de recherche plein texte (SQLite).
+    """
+    db.create_all()
+    added = add_missing_columns()
+    added += add_missing_indexes()
+    backfill_updated_at()
+    if db.engine.dialect.name == 'sqlite':
+        create_search_index(db.session)
+    return added
@@ -1,70 +1,104 @@
 from flask import Blueprint, request, jsonify
 from sqlalchemy import func, desc, asc
+from sqlalchemy.orm import aliased
 from datetime import datetime, timedelta
 import statistics
 from collections import defaultdict
 
 from src.models.user import db
 from src.models.invoice import Product, Supplier, PriceHistory, Invoice, InvoiceLine
+from src.services.downsampling import downsample, METHODS as DOWNSAMPLING_METHODS
+from src.services.snapshot import analytics_session, add_snapshot_headers
+from src.routes.params import parse_date_arg
 
 analytics_bp = Blueprint('analytics', __name__)
 
+# Âge de la copie lue, quand les rapports sont servis par le snapshot (voir services/snapshot.py)
+analytics_bp.after_request(add_snapshot_headers)
+
+# Clé de période calculée par SQLite à partir de la date (texte AAAA-MM-JJ)
+PERIOD_EXPRESSIONS = {
+    'daily': lambda column: func.strftime('%Y-%m-%d', column),
+    'weekly': lambda column: func.date(column, '-6 days', 'weekday 1'),  # lundi de la semaine
+    'monthly': lambda column: func.strftime('%Y-%m', column),
+    'quarterly': lambda column: func.strftime('%Y', column) + '-Q' +
+        func.cast((func.cast(func.strftime('%m', column), db.Integer) + 2) // 3, db.String),
+    'yearly': lambda column: func.strftime('%Y', column),
+}
+
+# Nombre de points renvoyés par défaut et au maximum : la réponse reste bornée quelle que soit la durée d'historique
+DEFAULT_MAX_POINTS = 500
+MAX_POINTS_LIMIT = 5000
+
 @analytics_bp.route('/price-evolution/<int:product_id>', methods=['GET'])
 def get_price_evolution(product_id):
     """Récupère l'évolution des prix pour un produit donné"""
-    granularity = request.args.get('granularity', 'monthly')  # monthly, quarterly, yearly
+    session = analytics_session()
+    granularity = request.args.get('granularity', 'monthly')  # daily, weekly, monthly, quarterly, yearly
     supplier_id = request.args.get('supplier_id', type=int)
+    max_points = request.args.get('max_points', DEFAULT_MAX_POINTS, type=int)
+    method = request.args.get('downsample', 'lttb')  # lttb, minmax
+    
+    if granularity not in PERIOD_EXPRESSIONS:
+        return jsonify({'error': f"Granularité inconnue : {granularity}"}), 400
+    if method not in DOWNSAMPLING_METHODS:
+        return jsonify({'error': f"Méthode de réduction inconnue : {method}"}), 400
+    max_points = min(max(max_points, 3), MAX_POINTS_LIMIT)
+    date_from = parse_date_arg('from')
+    date_to = parse_date_arg('to')
     
-    # Base query
-    query = db.session.query(PriceHistory).filter(PriceHistory.product_id == product_id)
+    # Agrégation en SQL, en deux temps : par jour (dans l'ordre de l'index, sans tri), puis par période
+    daily = session.query(
+        PriceHistory.date.label('day'),
+        func.sum(PriceHistory.unit_price).label('price_sum'),
+        func.min(PriceHistory.unit_price).label('min_price'),
+        func.max(PriceHistory.unit_price).label('max_price'),
+        func.sum(PriceHistory.quantity).label('quantity'),
+        func.count().label('transactions'),
+        func.group_concat(PriceHistory.supplier_id.distinct()).label('supplier_ids')
+    ).filter(PriceHistory.product_id == product_id)
     
     if supplier_id:
-        query = query.filter(PriceHistory.supplier_id == supplier_id)
+        daily = daily.filter(PriceHistory.supplier_id == supplier_id)
+    if date_from:
+        daily = daily.filter(PriceHistory.date >= date_from)
+    if date_to:
+        daily = daily.filter(PriceHistory.date <= date_to)
+    daily = daily.group_by(PriceHistory.date).subquery()
     
-    price_data = query.order_by(PriceHistory.date.asc()).all()
+    period = PERIOD_EXPRESSIONS[granularity](daily.c.day).label('period')
+    rows = session.query(
+        period,
+        func.sum(daily.c.price_sum) / func.sum(daily.c.transactions),
+        func.min(daily.c.min_price),
+        func.max(daily.c.max_price),
+        func.sum(daily.c.quantity),
+        func.sum(daily.c.transactions),
+        func.group_concat(daily.c.supplier_ids),
+        func.min(daily.c.day),
+        func.max(daily.c.day)
+    ).group_by(period).order_by(period).all()
     
-    if not price_data:
+    if not rows:
         return jsonify({'error': 'Aucune donnée de prix trouvée'}), 404
     
-    # Grouper les données selon la granularité
-    grouped_data = defaultdict(list)
-    
-    for price in price_data:
-        if granularity == 'monthly':
-            key = price.date.strftime('%Y-%m')
-        elif granularity == 'quarterly':
-            quarter = (price.date.month - 1) // 3 + 1
-            key = f"{price.date.year}-Q{quarter}"
-        else:  # yearly
-            key = str(price.date.year)
-        
-        grouped_data[key].append({
-            'date': price.date.isoformat(),
-            'unit_price': price.unit_price,
-            'supplier_id': price.supplier_id,
-            'supplier_name': price.supplier.name if price.supplier else 'Inconnu',
-            'quantity': price.quantity
-        })
+    # Fournisseurs de chaque période, sans doublon (les listes journalières se recoupent)
+    period_suppliers = [list(dict.fromkeys(int(s) for s in (row[6] or '').split(',') if s)) for row in rows]
+    supplier_ids = {s for ids in period_suppliers for s in ids}
+    supplier_names = dict(session.query(Supplier.id, Supplier.name).filter(Supplier.id.in_(supplier_ids)).all())
     
-    # Calculer les moyennes par période
-    evolution_data = []
-    for period, prices in sorted(grouped_data.items()):
-        avg_price = statistics.mean([p['unit_price'] for p in prices])
-        min_price = min([p['unit_price'] for p in prices])
-        max_price = max([p['unit_price'] for p in prices])
-        total_quantity = sum([p['quantity'] for p in prices])
-        
-        evolution_data.append({
-            'period': period,
-            'average_price': round(avg_price, 2),
-            'min_price': round(min_price, 2),
-            'max_price': round(max_price, 2),
-            'total_quantity': round(total_quantity, 2),
-            'transactions_count': len(prices),
-            'suppliers': list(set([p['supplier_name'] for p in prices]))
-        })
+    # Une entrée par période
+    evolution_data = [{
+        'period': row[0],
+        'average_price': round(row[1], 2),
+        'min_price': round(row[2], 2),
+        'max_price': round(row[3], 2),
+        'total_quantity': round(row[4] or 0, 2),
+        'transactions_count': row[5],
+        'suppliers': [supplier_names.get(s, 'Inconnu') for s in ids]
+    } for row, ids in zip(rows, period_suppliers)]
     
-    # Calculer la volatilité
+    # Calculer la volatilité (sur toutes les périodes, avant réduction)
     if len(evolution_data) > 1:
         first_price = evolution_data[0]['average_price']
         last_price = evolution_data[-1]['average_price']
@@ -72,8 +106,11 @@ def get_price_evolution(product_id):
     else:
         volatility = 0
     
+    periods_count = len(evolution_data)
+    evolution_data = downsample(evolution_data, max_points, method)
+    
     # Obtenir les infos du produit
-    product = Product.query.get(product_id)
+    product = session.get(Product, product_id)
     
     return jsonify({
         'product': {
@@ -84,22 +121,29 @@ def get_price_evolution(product_id):
         },
         'evolution': evolution_data,
         'volatility_percentage': volatility,
-        'total_data_points': len(price_data),
+        'total_data_points': sum(row[5] for row in rows),
         'date_range': {
-            'start': price_data[0].date.isoformat(),
-            'end': price_data[-1].date.isoformat()
+            'start': str(rows[0][7]),
+            'end': str(rows[-1][8])
+        },
+        'downsampling': {
+            'method': method if len(evolution_data) < periods_count else None,
+            'max_points': max_points,
+            'periods': periods_count,
+            'returned_points': len(evolution_data)
         }
     })
 
 @analytics_bp.route('/products-summary', methods=['GET'])
 def get_products_summary():
     """Récupère un résumé de tous les produits avec leurs données de prix"""
-    products = db.session.query(Product).all()
+    session = analytics_session()
+    products = session.query(Product).all()
     
     products_summary = []
     for product in products:
         # Obtenir les données de prix pour ce produit
-        price_history = db.session.query(PriceHistory)\
+        price_history = session.query(PriceHistory)\
             .filter(PriceHistory.product_id == product.id)\
             .order_by(PriceHistory.date.asc()).all()
         
@@ -151,7 +195,8 @@ def get_products_summary():
 @analytics_bp.route('/supplier-comparison/<int:product_id>', methods=['GET'])
 def get_supplier_comparison(product_id):
     """Compare les prix d'un produit entre différents fournisseurs"""
-    price_data = db.session.query(PriceHistory)\
+    session = analytics_session()
+    price_data = session.query(PriceHistory)\
         .filter(PriceHistory.product_id == product_id)\
         .join(Supplier)\
         .all()
@@ -188,15 +233,117 @@ def get_supplier_comparison(product_id):
         'suppliers_comparison': comparison
     })
 
+# Nombre maximal de produits par matrice de prix
+MAX_MATRIX_PRODUCTS = 1000
+MATRIX_BEST_BY = ('average_price', 'last_price')
+
+@analytics_bp.route('/price-matrix', methods=['GET'])
+def get_price_matrix():
+    """Compare les fournisseurs sur une liste de produits ou une catégorie (matrice produit × fournisseur)"""
+    session = analytics_session()
+    category = request.args.get('category')
+    best_by = request.args.get('best_by', 'average_price')
+    try:
+        product_ids = [int(i) for i in request.args.get('product_ids', '').split(',') if i.strip()]
+    except ValueError:
+        return jsonify({'error': 'product_ids attend des identifiants séparés par des virgules'}), 400
+    date_from = parse_date_arg('from')
+    date_to = parse_date_arg('to')
+    if not product_ids and not category:
+        return jsonify({'error': 'Indiquer product_ids ou category'}), 400
+    if best_by not in MATRIX_BEST_BY:
+        return jsonify({'error': f"best_by doit valoir {' ou '.join(MATRIX_BEST_BY)}"}), 400
+    
+    products_query = session.query(Product)
+    if product_ids:
+        products_query = products_query.filter(Product.id.in_(product_ids))
+    if category:
+        products_query = products_query.filter(Product.category == category)
+    products = products_query.order_by(Product.name).limit(MAX_MATRIX_PRODUCTS + 1).all()
+    if len(products) > MAX_MATRIX_PRODUCTS:
+        return jsonify({'error': f"Au plus {MAX_MATRIX_PRODUCTS} produits par matrice"}), 400
+    
+    # Une seule requête groupée par (produit, fournisseur) ; l'écart type vient des sommes
+    grouped = session.query(
+        PriceHistory.product_id,
+        PriceHistory.supplier_id,
+        func.avg(PriceHistory.unit_price).label('average_price'),
+        func.min(PriceHistory.unit_price).label('min_price'),
+        func.max(PriceHistory.unit_price).label('max_price'),
+        func.count().label('total_orders'),
+        func.sum(PriceHistory.quantity).label('total_quantity'),
+        func.sum(PriceHistory.unit_price * PriceHistory.unit_price).label('sum_squares'),
+        func.max(PriceHistory.date).label('last_order_date')
+    ).filter(PriceHistory.product_id.in_([product.id for product in products]))
+    if date_from:
+        grouped = grouped.filter(PriceHistory.date >= date_from)
+    if date_to:
+        grouped = grouped.filter(PriceHistory.date <= date_to)
+    grouped = grouped.group_by(PriceHistory.product_id, PriceHistory.supplier_id).subquery()
+    
+    # Dernier prix : une recherche par groupe dans l'index (produit, date, fournisseur), pas un tri de toutes les lignes
+    last = aliased(PriceHistory)
+    last_price = session.query(last.unit_price).filter(
+        last.product_id == grouped.c.product_id,
+        last.date == grouped.c.last_order_date,
+        last.supplier_id == grouped.c.supplier_id
+    ).order_by(last.id.desc()).limit(1).scalar_subquery()
+    
+    rows = session.query(grouped, last_price.label('last_price')).all()
+    
+    supplier_names = dict(session.query(Supplier.id, Supplier.name)
+                          .filter(Supplier.id.in_({row.supplier_id for row in rows})).all())
+    
+    cells = defaultdict(list)
+    for row in rows:
+        n = row.total_orders
+        variance = (row.sum_squares - n * row.average_price ** 2) / (n - 1) if n > 1 else 0
+        cells[row.product_id].append({
+            'supplier_id': row.supplier_id,
+            'supplier_name': supplier_names.get(row.supplier_id, 'Inconnu'),
+            'average_price': round(row.average_price, 2),
+            'min_price': round(row.min_price, 2),
+            'max_price': round(row.max_price, 2),
+            'last_price': round(row.last_price, 2),
+            'total_orders': n,
+            'total_quantity': round(row.total_quantity or 0, 2),
+            'last_order_date': str(row.last_order_date),
+            'price_stability': round(max(variance, 0) ** 0.5, 2)
+        })
+    
+    matrix = []
+    for product in products:
+        comparison = sorted(cells.get(product.id, []), key=lambda x: x['average_price'])
+        best = min(comparison, key=lambda x: (x[best_by], -x['total_orders'])) if comparison else None
+        for cell in comparison:
+            cell['is_best'] = cell is best
+        matrix.append({
+            'product': {
+                'id': product.id,
+                'name': product.name,
+                'category': product.category,
+                'unit': product.unit
+            },
+            'best_supplier_id': best['supplier_id'] if best else None,
+            'suppliers_comparison': comparison
+        })
+    
+    return jsonify({
+        'best_by': best_by,
+        'suppliers': [{'id': supplier_id, 'name': name} for supplier_id, name in sorted(supplier_names.items(), key=lambda x: x[1])],
+        'products': matrix
+    })
+
 @analytics_bp.route('/volatility-report', methods=['GET'])
 def get_volatility_report():
     """Génère un rapport de volatilité pour tous les produits"""
+    session = analytics_session()
     days = request.args.get('days', 90, type=int)  # Par défaut 90 jours
     
     cutoff_date = datetime.now().date() - timedelta(days=days)
     
     # Obtenir tous les produits avec des données de prix récentes
-    products_with_recent_prices = db.session.query(Product)\
+    products_with_recent_prices = session.query(Product)\
         .join(PriceHistory)\
         .filter(PriceHistory.date >= cutoff_date)\
         .distinct().all()
@@ -204,7 +351,7 @@ def get_volatility_report():
     volatility_report = []
     
     for product in products_with_recent_prices:
-        recent_prices = db.session.query(PriceHistory)\
+        recent_prices = session.query(PriceHistory)\
             .filter(PriceHistory.product_id == product.id)\
             .filter(PriceHistory.date >= cutoff_date)\
             .order_by(PriceHistory.date.asc()).all()
@@ -228,7 +375,7 @@ def get_volatility_report():
                 'price_start': round(recent_prices[0].unit_price, 2),
                 'price_end': round(recent_prices[-1].unit_price, 2),
                 'total_change_percent': round(((recent_prices[-1].unit_price - recent_prices[0].unit_price) / recent_prices[0].unit_price) * 100, 2),
-                'volatility_score': round(statistics.stdev(price_changes) if price_changes else 0, 2),
+                'volatility_score': round(statistics.stdev(price_changes) if len(price_changes) > 1 else 0, 2),
                 'max_increase': round(max(price_changes) if price_changes else 0, 2),
                 'max_decrease': round(min(price_changes) if price_changes else 0, 2),
                 'data_points': len(recent_prices)
@@ -1,57 +1,47 @@
-from flask import Blueprint, request, jsonify, current_app
-from werkzeug.utils import secure_filename
-import os
+from flask import Blueprint, Response, request, jsonify, current_app, send_file, abort, stream_with_context
 import json
-from datetime import datetime, date
-import pytesseract
-from PIL import Image
-import pdf2image
+import math
+from datetime import datetime, date, timedelta, timezone
 import re
+import uuid
 from difflib import SequenceMatcher
+from sqlalchemy import func
 
 from src.models.user import db
 from src.models.invoice import Product, Supplier, Invoice, InvoiceLine, PriceHistory
+from src.services.storage import store_upload, digest_from_reference, find_reference
+from src.services.metrics import span, measure_stream
+from src.services.ocr import ocr_region
+from src.services.ocr_profiles import (detect_supplier, profile_for, ocr_pages, summarize_ocr, update_profile, english_ratio,
+                                       LANGUAGES_PATTERN, PSM_RANGE, DPI_RANGE, PREPROCESS_MODES)
+from src.services.layouts import load_template, learn_template, is_ready, read_zones
+from src.services.rasters import rasterize, rasterize_pages, page_path, thumbnail_path, save_words
+from src.services.search import search, SCOPES
+from src.routes.params import parse_date_arg
 
 invoice_bp = Blueprint('invoice', __name__)
 
-# Configuration pour l'upload de fichiers
-UPLOAD_FOLDER = 'uploads'
+# Configuration pour l'upload de fichiers (le dossier est défini par UPLOAD_FOLDER dans la config)
 ALLOWED_EXTENSIONS = {'pdf', 'png', 'jpg', 'jpeg', 'gif'}
 
-def allowed_file(filename):
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+# Patterns de reconnaissance
+INVOICE_NUMBER_PATTERN = r'(?:facture|invoice|n°|no\.?|number)\s*:?\s*([A-Z0-9\-]+)'
+DATE_PATTERN = r'(\d{1,2}[\/\-\.]\d{1,2}[\/\-\.]\d{2,4})'
+PRICE_PATTERN = r'(\d+[,\.]\d{2})\s*€?'
 
-def extract_text_from_image(image_path):
-    """Extrait le texte d'une image avec Tesseract OCR"""
-    try:
-        image = Image.open(image_path)
-        text = pytesseract.image_to_string(image, lang='fra+eng')
-        return text
-    except Exception as e:
-        current_app.logger.error(f"Erreur OCR: {e}")
-        return ""
+# Confiance minimale de chaque zone pour accepter une lecture par gabarit
+TEMPLATE_MIN_CONFIDENCE = 0.75
 
-def extract_text_from_pdf(pdf_path):
-    """Extrait le texte d'un PDF"""
-    try:
-        pages = pdf2image.convert_from_path(pdf_path)
-        text = ""
-        for page in pages:
-            text += pytesseract.image_to_string(page, lang='fra+eng') + "\n"
-        return text
-    except Exception as e:
-        current_app.logger.error(f"Erreur extraction PDF: {e}")
-        return ""
+# Marge reprise avant ?since= : une écriture horodatée juste avant mais validée après n'est pas perdue
+CATALOG_SINCE_OVERLAP = timedelta(seconds=5)
+
+def allowed_file(filename):
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 def parse_invoice_text(text):
     """Parse le texte extrait pour identifier les éléments de facture"""
     lines = text.split('\n')
     
-    # Patterns de reconnaissance
-    invoice_number_pattern = r'(?:facture|invoice|n°|no\.?|number)\s*:?\s*([A-Z0-9\-]+)'
-    date_pattern = r'(\d{1,2}[\/\-\.]\d{1,2}[\/\-\.]\d{2,4})'
-    price_pattern = r'(\d+[,\.]\d{2})\s*€?'
-    
     # Données extraites
     invoice_data = {
         'invoice_number': '',
@@ -63,7 +53,7 @@ def parse_invoice_text(text):
     
     # Extraire numéro de facture
     for line in lines:
-        invoice_match = re.search(invoice_number_pattern, line, re.IGNORECASE)
+        invoice_match = re.search(INVOICE_NUMBER_PATTERN, line, re.IGNORECASE)
         if invoice_match:
             invoice_data['invoice_number'] = invoice_match.group(1)
             break
@@ -71,7 +61,7 @@ def parse_invoice_text(text):
     # Extraire dates
     dates = []
     for line in lines:
-        date_matches = re.findall(date_pattern, line)
+        date_matches = re.findall(DATE_PATTERN, line)
         dates.extend(date_matches)
     
     if dates:
@@ -82,7 +72,7 @@ def parse_invoice_text(text):
     for i, line in enumerate(lines):
         if len(line.strip()) > 10:  # Ignore les lignes trop courtes
             # Chercher des prix dans la ligne
-            prices = re.findall(price_pattern, line)
+            prices = re.findall(PRICE_PATTERN, line)
             if prices:
                 invoice_data['lines'].append({
                     'raw_description': line.strip(),
@@ -95,6 +85,32 @@ def parse_invoice_text(text):
     
     return invoice_data
 
+def parse_template_zones(zones):
+    """Construit les données de facture à partir des zones lues par gabarit.
+
+    Retourne None si une zone est peu fiable ou ne contient pas la valeur
+    attendue : le gabarit ne correspond plus et l'extraction complète prend le relais.
+    """
+    if any(zone['confidence'] < TEMPLATE_MIN_CONFIDENCE for zone in zones.values()):
+        return None
+    
+    number_text = zones['invoice_number']['text']
+    number_match = re.search(INVOICE_NUMBER_PATTERN, number_text, re.IGNORECASE) or \
+        re.search(r'([A-Z0-9\-]*\d[A-Z0-9\-]*)', number_text, re.IGNORECASE)
+    date_match = re.search(DATE_PATTERN, zones['invoice_date']['text'])
+    totals = re.findall(PRICE_PATTERN, zones['total_amount']['text'])
+    lines = parse_invoice_text(zones['lines']['text'])['lines']
+    if not (number_match and date_match and totals and lines):
+        return None
+    
+    return {
+        'invoice_number': number_match.group(1),
+        'invoice_date': date_match.group(1),
+        'supplier_name': '',
+        'total_amount': float(totals[-1].replace(',', '.')),
+        'lines': lines
+    }
+
 def find_similar_products(description):
     """Trouve des produits similaires dans la base de données"""
     products = Product.query.all()
@@ -110,54 +126,319 @@ def find_similar_products(description):
     
     return sorted(similarities, key=lambda x: x['similarity'], reverse=True)
 
+def pages_to_dict(raster_meta):
+    """Décrit les pages rastérisées d'un document avec les URLs de leurs images"""
+    digest = raster_meta['digest']
+    return [{
+        'page': page['page'],
+        'width': page['width'],
+        'height': page['height'],
+        'image_url': f"/api/invoices/files/{digest}/pages/{page['page']}/image",
+        'thumbnail_url': f"/api/invoices/files/{digest}/pages/{page['page']}/thumbnail"
+    } for page in raster_meta['pages']]
+
+def get_raster_meta_or_404(file_id):
+    """Retrouve le document stocké d'empreinte file_id et ses pages rastérisées"""
+    reference = find_reference(file_id) if digest_from_reference(file_id) else None
+    if reference is None:
+        abort(404)
+    return rasterize(reference)
+
+def suggest_products(lines):
+    """Ajoute à chaque ligne ses meilleures suggestions de produits"""
+    with span('product_matching'):
+        for line in lines:
+            suggestions = find_similar_products(line['raw_description'])
+            line['suggested_products'] = suggestions[:3]  # Top 3 suggestions
+            line['product_match_confidence'] = suggestions[0]['similarity'] if suggestions else 0.0
+    return lines
+
+def merge_page_data(invoice_data, page_data, line_offset):
+    """Ajoute à invoice_data l'analyse d'une page et retourne les lignes ajoutées.
+
+    Les numéros de ligne sont décalés de line_offset (lignes des pages
+    précédentes) : le résultat est celui de parse_invoice_text sur le texte complet.
+    """
+    for field in ('invoice_number', 'invoice_date'):
+        if not invoice_data[field]:
+            invoice_data[field] = page_data[field]
+    for line in page_data['lines']:
+        line['line_number'] += line_offset
+    invoice_data['lines'].extend(page_data['lines'])
+    return page_data['lines']
+
+def process_upload(file_ref, created):
+    """Traitement d'un document stocké : rastérisation, fournisseur, OCR, analyse, suggestions de produits.
+
+    Générateur d'événements (type, données) : 'start' dès la première page
+    rastérisée, 'supplier', puis un 'page' par page traitée (avec ses lignes
+    analysées), et enfin 'complete' avec la réponse complète de l'upload. Les
+    pages sont rastérisées une à une, au fil de l'OCR. 'start' et 'complete'
+    portent un identifiant propre à cet upload (``upload_id``) : un même
+    fichier envoyé deux fois a la même référence, mais pas le même upload_id.
+    """
+    upload_id = uuid.uuid4().hex
+    existing_invoice = None if created else Invoice.query.filter_by(file_path=file_ref).first()
+    
+    # Rastériser une seule fois : les pages en cache servent aussi aux aperçus et à la relecture de zones
+    rendering = rasterize_pages(file_ref)
+    try:
+        raster_meta = next(rendering)
+    except Exception as e:
+        current_app.logger.error(f"Erreur rastérisation: {e}")
+        raster_meta = None
+    page_count = raster_meta['page_count'] if raster_meta else 0
+    
+    def rendered_pages():
+        """Chemins des pages, chacune dès qu'elle est rastérisée"""
+        for number in range(1, page_count + 1):
+            if number > len(raster_meta['pages']):
+                next(rendering)
+            yield page_path(raster_meta['digest'], number)
+    
+    def finish_rendering():
+        """Rastérise les pages restantes (gabarit, réponse finale)"""
+        for _ in rendering:
+            pass
+    
+    yield 'start', {
+        'upload_id': upload_id,
+        'file_path': file_ref,
+        'duplicate': not created,
+        'existing_invoice_id': existing_invoice.id if existing_invoice else None,
+        'file_id': raster_meta['digest'] if raster_meta else None,
+        'pages': pages_to_dict(raster_meta) if raster_meta else [],
+        'page_count': page_count
+    }
+    
+    # Reconnaître le fournisseur sur l'en-tête, puis OCR des pages avec son profil
+    supplier, ocr_stats = None, None
+    extracted_text = ""
+    invoice_data = parse_invoice_text(extracted_text)
+    if raster_meta:
+        texts = []
+        try:
+            supplier, _ = detect_supplier(page_path(raster_meta['digest'], 1))
+            profile = profile_for(supplier)
+            yield 'supplier', {
+                'supplier_id': supplier.id if supplier else None,
+                'supplier_name': supplier.name if supplier else None
+            }
+            
+            # Fournisseur connu : relire seulement les zones de son gabarit
+            zones_data = None
+            template = load_template(supplier)
+            if is_ready(template, page_count):
+                finish_rendering()
+                with span('template'):
+                    zones, pixel_ratio = read_zones(template, raster_meta, profile['languages'])
+                    zones_data = parse_template_zones(zones)
+                extraction = 'template' if zones_data else 'full_after_template'
+            else:
+                extraction = 'full'
+            
+            if zones_data:
+                invoice_data = zones_data
+                extracted_text = '\n'.join(zone['text'] for zone in zones.values()) + '\n'
+                confidences = [zone['confidence'] for zone in zones.values()]
+                ocr_stats = {
+                    'profile': profile,
+                    'confidence': round(sum(confidences) / len(confidences), 3),
+                    'english_ratio': round(english_ratio(extracted_text), 3),
+                    'ocr_pixel_ratio': pixel_ratio
+                }
+                # Les zones couvrent tout le document : un seul envoi
+                yield 'page', {
+                    'page': None,
+                    'pages_done': page_count,
+                    'page_count': page_count,
+                    'invoice_number': invoice_data['invoice_number'],
+                    'invoice_date': invoice_data['invoice_date'],
+                    'total_amount': invoice_data['total_amount'],
+                    'lines': suggest_products(invoice_data['lines'])
+                }
+            else:
+                # Chaque page est analysée dès la fin de son OCR
+                confidences, words, line_offset = [], [], 0
+                for page_text, confidence, page_words in ocr_pages(rendered_pages(), profile, raster_meta['dpi']):
+                    texts.append(page_text)
+                    confidences.append(confidence)
+                    words.append(page_words)
+                    with span('parse'):
+                        lines = merge_page_data(invoice_data, parse_invoice_text(page_text), line_offset)
+                    line_offset += len(page_text.split('\n'))
+                    yield 'page', {
+                        'page': len(texts),
+                        'pages_done': len(texts),
+                        'page_count': page_count,
+                        'confidence': confidence,
+                        'invoice_number': invoice_data['invoice_number'],
+                        'invoice_date': invoice_data['invoice_date'],
+                        'total_amount': invoice_data['total_amount'],
+                        'lines': suggest_products(lines)
+                    }
+                extracted_text = '\n'.join(texts) + '\n'
+                ocr_stats = summarize_ocr(extracted_text, confidences, profile)
+                # Positions des mots conservées pour apprendre le gabarit à la validation
+                save_words(raster_meta['digest'], words)
+                ocr_stats['ocr_pixel_ratio'] = 1.0
+            ocr_stats['extraction'] = extraction
+        except Exception as e:
+            current_app.logger.error(f"Erreur OCR: {e}")
+            # Les pages déjà lues restent exploitables
+            extracted_text = '\n'.join(texts) + '\n' if texts else ""
+        if ocr_stats:
+            ocr_stats['supplier_id'] = supplier.id if supplier else None
+        try:
+            finish_rendering()
+        except Exception as e:
+            current_app.logger.error(f"Erreur rastérisation: {e}")
+    
+    if supplier and not invoice_data['supplier_name']:
+        invoice_data['supplier_name'] = supplier.name
+    
+    # Calculer un score de confiance global
+    if invoice_data['lines']:
+        global_confidence = sum([line['ocr_confidence'] for line in invoice_data['lines']]) / len(invoice_data['lines'])
+    else:
+        global_confidence = 0.0
+    
+    yield 'complete', {
+        'success': True,
+        'upload_id': upload_id,
+        'file_path': file_ref,
+        'duplicate': not created,
+        'existing_invoice_id': existing_invoice.id if existing_invoice else None,
+        'file_id': raster_meta['digest'] if raster_meta else None,
+        'pages': pages_to_dict(raster_meta) if raster_meta else [],
+        'extracted_text': extracted_text,
+        'ocr_stats': ocr_stats,
+        'parsed_data': invoice_data,
+        'global_confidence': global_confidence
+    }
+
+def upload_error():
+    """Message d'erreur si la requête ne contient pas un fichier accepté (None sinon)"""
+    if 'file' not in request.files:
+        return 'Aucun fichier fourni'
+    file = request.files['file']
+    if file.filename == '':
+        return 'Aucun fichier sélectionné'
+    if not allowed_file(file.filename):
+        return 'Type de fichier non autorisé'
+    return None
+
+def store_uploaded_file(file):
+    """Stocke un fichier uploadé ; retourne (référence, créé). La rastérisation se fait dans process_upload"""
+    extension = file.filename.rsplit('.', 1)[1].lower()
+    
+    # Stockage adressé par contenu : un fichier identique n'est stocké qu'une fois
+    with span('store'):
+        return store_upload(file, extension)
+
+def sse_event(event, data):
+    """Sérialise un événement au format Server-Sent Events"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
 @invoice_bp.route('/upload', methods=['POST'])
 def upload_invoice():
     """Upload et traitement d'une facture (PDF ou image)"""
-    if 'file' not in request.files:
-        return jsonify({'error': 'Aucun fichier fourni'}), 400
+    error = upload_error()
+    if error:
+        return jsonify({'error': error}), 400
     
-    file = request.files['file']
-    if file.filename == '':
-        return jsonify({'error': 'Aucun fichier sélectionné'}), 400
+    stored = store_uploaded_file(request.files['file'])
+    for event, data in process_upload(*stored):
+        if event == 'complete':
+            return jsonify(data)
+
+@invoice_bp.route('/upload/stream', methods=['POST'])
+def upload_invoice_stream():
+    """Upload avec progression : chaque page est envoyée (Server-Sent Events) dès son OCR terminé"""
+    error = upload_error()
+    if error:
+        return jsonify({'error': error}), 400
     
-    if file and allowed_file(file.filename):
-        filename = secure_filename(file.filename)
-        
-        # Créer le dossier uploads s'il n'existe pas
-        os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-        file_path = os.path.join(UPLOAD_FOLDER, filename)
-        file.save(file_path)
-        
-        # Extraire le texte selon le type de fichier
-        if filename.lower().endswith('.pdf'):
-            extracted_text = extract_text_from_pdf(file_path)
-        else:
-            extracted_text = extract_text_from_image(file_path)
-        
-        # Parser les données de la facture
-        invoice_data = parse_invoice_text(extracted_text)
-        
-        # Calculer un score de confiance global
-        if invoice_data['lines']:
-            global_confidence = sum([line['ocr_confidence'] for line in invoice_data['lines']]) / len(invoice_data['lines'])
-        else:
-            global_confidence = 0.0
-        
-        # Enrichissement avec suggestions de produits
-        for line in invoice_data['lines']:
-            suggestions = find_similar_products(line['raw_description'])
-            line['suggested_products'] = suggestions[:3]  # Top 3 suggestions
-            line['product_match_confidence'] = suggestions[0]['similarity'] if suggestions else 0.0
-        
-        return jsonify({
-            'success': True,
-            'file_path': file_path,
-            'extracted_text': extracted_text,
-            'parsed_data': invoice_data,
-            'global_confidence': global_confidence
-        })
+    stored = store_uploaded_file(request.files['file'])
+    
+    def events():
+        try:
+            for event, data in process_upload(*stored):
+                yield sse_event(event, data)
+        except Exception as e:
+            current_app.logger.error(f"Erreur traitement: {e}")
+            yield sse_event('error', {'error': str(e)})
     
-    return jsonify({'error': 'Type de fichier non autorisé'}), 400
+    return Response(stream_with_context(measure_stream(events())), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'  # pas de mise en tampon par un proxy nginx
+    })
+
+@invoice_bp.route('/files/<file_id>/pages', methods=['GET'])
+def get_file_pages(file_id):
+    """Liste les pages rastérisées d'un document uploadé"""
+    raster_meta = get_raster_meta_or_404(file_id)
+    return jsonify({'file_id': file_id, 'dpi': raster_meta['dpi'], 'pages': pages_to_dict(raster_meta)})
+
+@invoice_bp.route('/files/<file_id>/pages/<int:page>/image', methods=['GET'])
+def get_page_image(file_id, page):
+    """Renvoie l'image d'une page à la résolution de l'OCR"""
+    raster_meta = get_raster_meta_or_404(file_id)
+    if not 1 <= page <= len(raster_meta['pages']):
+        abort(404)
+    return send_file(page_path(file_id, page), mimetype='image/png', max_age=86400)
+
+@invoice_bp.route('/files/<file_id>/pages/<int:page>/thumbnail', methods=['GET'])
+def get_page_thumbnail(file_id, page):
+    """Renvoie la miniature d'une page pour l'aperçu de validation"""
+    raster_meta = get_raster_meta_or_404(file_id)
+    if not 1 <= page <= len(raster_meta['pages']):
+        abort(404)
+    return send_file(thumbnail_path(file_id, page), mimetype='image/jpeg', max_age=86400)
+
+@invoice_bp.route('/files/<file_id>/pages/<int:page>/ocr', methods=['POST'])
+def reocr_region(file_id, page):
+    """Relit une seule zone d'une page (par exemple une ligne mal lue)"""
+    raster_meta = get_raster_meta_or_404(file_id)
+    if not 1 <= page <= len(raster_meta['pages']):
+        abort(404)
+    data = request.get_json() or {}
+    
+    try:
+        x, y = float(data['x']), float(data['y'])
+        width, height = float(data['width']), float(data['height'])
+        psm = int(data.get('psm', 7))  # 7 = une seule ligne de texte
+        if not all(math.isfinite(value) for value in (x, y, width, height)):
+            raise ValueError
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'error': 'Zone invalide : x, y, width et height sont requis'}), 400
+    
+    # Coordonnées relatives (0-1) par défaut, indépendantes de la taille d'affichage
+    page_size = raster_meta['pages'][page - 1]
+    if data.get('units', 'relative') == 'relative':
+        x, width = x * page_size['width'], width * page_size['width']
+        y, height = y * page_size['height'], height * page_size['height']
+    
+    # Zone ramenée aux limites de la page
+    box = (max(0, int(x)), max(0, int(y)),
+           min(page_size['width'], int(round(x + width))), min(page_size['height'], int(round(y + height))))
+    if width <= 0 or height <= 0 or box[0] >= box[2] or box[1] >= box[3]:
+        return jsonify({'error': 'Zone vide ou hors de la page'}), 400
+    try:
+        result = ocr_region(page_path(file_id, page), box, psm=psm, lang=data.get('lang', 'fra+eng'))
+    except Exception as e:
+        current_app.logger.error(f"Erreur OCR zone: {e}")
+        return jsonify({'error': str(e)}), 500
+    
+    parsed_lines = parse_invoice_text(result['text'])['lines']
+    return jsonify({
+        'file_id': file_id,
+        'page': page,
+        'box': box,
+        'text': result['text'],
+        'confidence': result['confidence'],
+        'parsed_line': parsed_lines[0] if parsed_lines else None
+    })
 
 @invoice_bp.route('/save', methods=['POST'])
 def save_invoice():
@@ -173,6 +454,10 @@ def save_invoice():
             db.session.add(supplier)
             db.session.flush()  # Pour obtenir l'ID
         
+        # Affiner le profil OCR et le gabarit du fournisseur avec cette facture validée
+        update_profile(supplier, data.get('ocr_stats'))
+        learn_template(supplier, data)
+        
         # Créer la facture
         invoice = Invoice(
             invoice_number=data.get('invoice_number', ''),
@@ -182,7 +467,8 @@ def save_invoice():
             currency=data.get('currency', 'EUR'),
             status='validated',
             ocr_confidence=data.get('global_confidence', 0.0),
-            file_path=data.get('file_path', '')
+            file_path=data.get('file_path', ''),
+            ocr_text=data.get('extracted_text') or None
         )
         db.session.add(invoice)
         db.session.flush()
@@ -261,17 +547,76 @@ def get_invoices():
         'current_page': page
     })
 
+@invoice_bp.route('/search', methods=['GET'])
+def search_invoices():
+    """Recherche plein texte dans les lignes et le texte OCR des factures"""
+    query = request.args.get('q', '')
+    scope = request.args.get('scope', 'all')
+    page = max(1, request.args.get('page', 1, type=int))
+    per_page = min(100, max(1, request.args.get('per_page', 20, type=int)))
+    if scope not in SCOPES:
+        return jsonify({'error': f"scope doit valoir {', '.join(SCOPES)}"}), 400
+    
+    date_from = parse_date_arg('from')
+    date_to = parse_date_arg('to')
+    
+    results, total, ranking = search(
+        db.session, query, scope=scope, supplier_id=request.args.get('supplier_id', type=int),
+        date_from=date_from, date_to=date_to, page=page, per_page=per_page
+    )
+    return jsonify({
+        'query': query,
+        'ranking': ranking,
+        'results': results,
+        'total': total,  # None quand le compter coûterait un parcours complet
+        'pages': (total + per_page - 1) // per_page if total is not None else None,
+        'current_page': page
+    })
+
 @invoice_bp.route('/invoices/<int:invoice_id>', methods=['GET'])
 def get_invoice(invoice_id):
     """Récupère une facture spécifique"""
     invoice = Invoice.query.get_or_404(invoice_id)
     return jsonify(invoice.to_dict())
 
+def catalog_version(model):
+    """Version d'un catalogue : nombre de lignes et dernière modification (index sur updated_at)"""
+    count, last_update = db.session.query(func.count(model.id), func.max(model.updated_at)).one()
+    return f"{model.__tablename__}-{count}-{last_update.isoformat() if last_update else 0}"
+
+def catalog_response(model):
+    """Liste d'un catalogue pour un client qui en garde une copie locale.
+
+    La version est envoyée comme ETag : si le client a déjà cette version
+    (If-None-Match), la réponse est un 304 sans relire la liste. Avec
+    ``?since=<date ISO>``, seules les lignes créées ou modifiées depuis sont
+    renvoyées, à fusionner par id avec la copie locale.
+    """
+    since = request.args.get('since')
+    try:
+        since = datetime.fromisoformat(since) if since else None
+    except ValueError:
+        return jsonify({'error': 'since attendu au format ISO 8601 (AAAA-MM-JJTHH:MM:SS)'}), 400
+    if since and since.tzinfo:
+        since = since.astimezone(timezone.utc).replace(tzinfo=None)
+    
+    version = catalog_version(model)
+    if request.if_none_match.contains(version):
+        response = Response(status=304)
+    else:
+        query = model.query
+        if since:
+            query = query.filter(model.updated_at > since - CATALOG_SINCE_OVERLAP)
+        response = jsonify([row.to_dict() for row in query.order_by(model.id)])
+    response.set_etag(version)
+    # Le navigateur garde la liste mais revalide à chaque fois (réponse 304 si inchangée)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
 @invoice_bp.route('/products', methods=['GET'])
 def get_products():
-    """Récupère la liste des produits"""
-    products = Product.query.all()
-    return jsonify([product.to_dict() for product in products])
+    """Récupère la liste des produits (complète ou modifiée depuis ?since=, avec ETag)"""
+    return catalog_response(Product)
 
 @invoice_bp.route('/products', methods=['POST'])
 def create_product():
@@ -291,9 +636,8 @@ def create_product():
 
 @invoice_bp.route('/suppliers', methods=['GET'])
 def get_suppliers():
-    """Récupère la liste des fournisseurs"""
-    suppliers = Supplier.query.all()
-    return jsonify([supplier.to_dict() for supplier in suppliers])
+    """Récupère la liste des fournisseurs (complète ou modifiée depuis ?since=, avec ETag)"""
+    return catalog_response(Supplier)
 
 @invoice_bp.route('/suppliers', methods=['POST'])
 def create_supplier():
@@ -309,4 +653,68 @@ def create_supplier():
     db.session.add(supplier)
     db.session.commit()
     
-    return jsonify(supplier.to_dict()), 201
\ No newline at end of file
+    return jsonify(supplier.to_dict()), 201
+
+@invoice_bp.route('/suppliers/<int:supplier_id>/ocr-profile', methods=['GET'])
+def get_supplier_ocr_profile(supplier_id):
+    """Récupère le profil OCR d'un fournisseur (appris et effectif)"""
+    supplier = Supplier.query.get_or_404(supplier_id)
+    return jsonify({
+        'supplier_id': supplier.id,
+        'learned': supplier.ocr_profile_to_dict(),
+        'effective': profile_for(supplier)
+    })
+
+@invoice_bp.route('/suppliers/<int:supplier_id>/ocr-profile', methods=['PUT'])
+def update_supplier_ocr_profile(supplier_id):
+    """Corrige manuellement le profil OCR d'un fournisseur (null = réglage par défaut)"""
+    supplier = Supplier.query.get_or_404(supplier_id)
+    data = request.get_json() or {}
+    
+    def in_range(value, bounds):
+        return isinstance(value, int) and not isinstance(value, bool) and bounds[0] <= value <= bounds[1]
+    
+    languages = data.get('languages')
+    if languages is not None and not (isinstance(languages, str) and LANGUAGES_PATTERN.match(languages)):
+        return jsonify({'error': 'Langues attendues sous la forme fra ou fra+eng'}), 400
+    if data.get('psm') is not None and not in_range(data['psm'], PSM_RANGE):
+        return jsonify({'error': f"psm doit être un entier entre {PSM_RANGE[0]} et {PSM_RANGE[1]}"}), 400
+    if data.get('dpi') is not None and not in_range(data['dpi'], DPI_RANGE):
+        return jsonify({'error': f"dpi doit être un entier entre {DPI_RANGE[0]} et {DPI_RANGE[1]}"}), 400
+    if data.get('preprocess') is not None and data['preprocess'] not in PREPROCESS_MODES:
+        return jsonify({'error': 'Prétraitement inconnu'}), 400
+    
+    if 'languages' in data:
+        supplier.ocr_languages = languages
+    if 'psm' in data:
+        supplier.ocr_psm = data['psm']
+    if 'dpi' in data:
+        supplier.ocr_dpi = data['dpi']
+    if 'preprocess' in data:
+        supplier.ocr_preprocess = data['preprocess']
+    
+    db.session.commit()
+    return jsonify({
+        'supplier_id': supplier.id,
+        'learned': supplier.ocr_profile_to_dict(),
+        'effective': profile_for(supplier)
+    })
+
+@invoice_bp.route('/suppliers/<int:supplier_id>/layout-template', methods=['GET'])
+def get_supplier_layout_template(supplier_id):
+    """Récupère le gabarit de mise en page appris pour un fournisseur"""
+    supplier = Supplier.query.get_or_404(supplier_id)
+    template = load_template(supplier)
+    return jsonify({
+        'supplier_id': supplier.id,
+        'template': template,
+        'ready': is_ready(template, template['pages']) if template else False
+    })
+
+@invoice_bp.route('/suppliers/<int:supplier_id>/layout-template', methods=['DELETE'])
+def delete_supplier_layout_template(supplier_id):
+    """Oublie le gabarit d'un fournisseur (par exemple après un changement de mise en page)"""
+    supplier = Supplier.query.get_or_404(supplier_id)
+    supplier.layout_template = None
+    db.session.commit()
+    return jsonify({'supplier_id': supplier.id, 'template': None, 'ready': False})
@@ -0,0 +1,10 @@
+from flask import Blueprint, Response
+
+from src.services.metrics import render_prometheus
+
+metrics_bp = Blueprint('metrics', __name__)
+
+@metrics_bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Expose les métriques de l'application au format texte Prometheus"""
+    return Response(render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,15 @@
+"""Lecture des paramètres de requête communs à plusieurs routes"""
+from datetime import datetime
+
+from flask import abort, jsonify, make_response, request
+
+
+def parse_date_arg(name):
+    """Date AAAA-MM-JJ du paramètre ``name`` (None s'il est absent) ; répond 400 si elle est invalide"""
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        abort(make_response(jsonify({'error': f"{name} : date attendue au format AAAA-MM-JJ"}), 400))
@@ -0,0 +1,89 @@
+"""Réduction du nombre de points des séries de prix envoyées aux graphiques.
+
+Deux méthodes, appliquées aux périodes déjà agrégées (une période par point) :
+
+- ``lttb`` (Largest-Triangle-Three-Buckets) garde les périodes qui dessinent
+  le mieux la courbe du prix moyen ; les points conservés sont des périodes
+  réelles, inchangées ;
+- ``minmax`` fusionne les périodes consécutives par paquets : chaque point
+  garde le minimum et le maximum réels du paquet, le prix moyen est pondéré
+  par le nombre de transactions.
+
+La première et la dernière période sont toujours conservées.
+"""
+
+METHODS = ('lttb', 'minmax')
+
+
+def lttb(points, threshold, value=lambda point: point['average_price']):
+    """Sélectionne ``threshold`` points par Largest-Triangle-Three-Buckets.
+
+    L'abscisse est le rang de la période : les périodes vides ne sont pas
+    renvoyées, l'écart entre deux points reste celui affiché par le graphique.
+    """
+    count = len(points)
+    if threshold >= count or threshold < 3:
+        return list(points)
+
+    sampled = [points[0]]
+    bucket_size = (count - 2) / (threshold - 2)
+    selected = 0
+    for bucket in range(threshold - 2):
+        start = int(bucket * bucket_size) + 1
+        end = int((bucket + 1) * bucket_size) + 1
+
+        # Moyenne du paquet suivant (le dernier point pour le dernier paquet)
+        next_start, next_end = end, min(int((bucket + 2) * bucket_size) + 1, count)
+        if next_start >= next_end:
+            next_start, next_end = count - 1, count
+        avg_x = (next_start + next_end - 1) / 2
+        avg_y = sum(value(points[i]) for i in range(next_start, next_end)) / (next_end - next_start)
+
+        # Point du paquet qui forme le plus grand triangle avec le point retenu et cette moyenne
+        selected_y = value(points[selected])
+        best, best_area = start, -1.0
+        for i in range(start, end):
+            area = abs((selected - avg_x) * (value(points[i]) - selected_y) - (selected - i) * (avg_y - selected_y))
+            if area > best_area:
+                best, best_area = i, area
+        sampled.append(points[best])
+        selected = best
+
+    sampled.append(points[-1])
+    return sampled
+
+
+def _merge(bucket):
+    transactions = sum(point['transactions_count'] for point in bucket)
+    suppliers = []
+    for point in bucket:
+        suppliers.extend(name for name in point['suppliers'] if name not in suppliers)
+    return {
+        'period': bucket[0]['period'],
+        'period_end': bucket[-1]['period'],
+        'average_price': round(sum(p['average_price'] * p['transactions_count'] for p in bucket) / transactions, 2),
+        'min_price': min(point['min_price'] for point in bucket),
+        'max_price': max(point['max_price'] for point in bucket),
+        'total_quantity': round(sum(point['total_quantity'] for point in bucket), 2),
+        'transactions_count': transactions,
+        'suppliers': suppliers,
+    }
+
+
+def minmax(points, threshold):
+    """Fusionne les périodes en ``threshold`` paquets en conservant minimum et maximum"""
+    count = len(points)
+    if threshold >= count or threshold < 3:
+        return list(points)
+
+    # Première et dernière période seules, les autres réparties en paquets réguliers
+    buckets = threshold - 2
+    inner = points[1:-1]
+    merged = [_merge(inner[(i * len(inner)) // buckets:((i + 1) * len(inner)) // buckets]) for i in range(buckets)]
+    return [points[0]] + merged + [points[-1]]
+
+
+def downsample(points, threshold, method='lttb'):
+    if method == 'minmax':
+        return minmax(points, threshold)
+    return lttb(points, threshold)
@@ -0,0 +1,192 @@
+"""Gabarits de mise en page par fournisseur.
+
+Chez un fournisseur récurrent, le numéro, la date, le total et le tableau des
+lignes sont toujours au même endroit. Le gabarit d'un fournisseur retient ces
+zones (coordonnées relatives à la page) :
+
+    {"pages": 1, "samples": 4, "fields": {
+        "invoice_number": {"page": 1, "box": [0.62, 0.08, 0.81, 0.10], "hits": 4},
+        "invoice_date":   {...}, "total_amount": {...}, "lines": {...}}}
+
+Il est appris à la validation d'une facture : les valeurs saisies par
+l'utilisateur sont retrouvées parmi les mots positionnés de l'OCR complet
+(``words.json`` du cache de pages). Une zone n'est utilisée qu'après avoir été
+retrouvée au même endroit sur ``MIN_HITS`` factures ; si une facture la place
+ailleurs, elle repart de zéro.
+
+À l'upload, seules les zones du gabarit sont relues. La vérification du
+résultat (valeurs lisibles, confiance suffisante) est faite par l'appelant,
+qui repasse en extraction complète si le gabarit ne correspond plus.
+"""
+import json
+from datetime import datetime
+
+from src.services.ocr import ocr_region
+from src.services.rasters import load_words, page_path
+from src.services.storage import digest_from_reference
+
+FIELDS = ('invoice_number', 'invoice_date', 'total_amount')
+MIN_HITS = 2
+
+# Marges ajoutées autour des zones apprises (fraction de la page)
+FIELD_MARGIN_X = 0.03
+FIELD_MARGIN_Y = 0.01
+LINES_MARGIN = 0.01
+
+# Mode Tesseract : une ligne pour les champs, un bloc pour le tableau
+FIELD_PSM = 7
+LINES_PSM = 6
+
+
+def load_template(supplier):
+    """Gabarit d'un fournisseur (None s'il n'en a pas encore)"""
+    if supplier is None or not supplier.layout_template:
+        return None
+    return json.loads(supplier.layout_template)
+
+
+def _parse_amount(value):
+    value = value.replace('€', '').replace(' ', '').replace(',', '.')
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def _date_variants(iso_date):
+    """Suites de chiffres sous lesquelles une date AAAA-MM-JJ peut être imprimée"""
+    try:
+        day = datetime.strptime(iso_date, '%Y-%m-%d')
+    except (TypeError, ValueError):
+        return set()
+    return {day.strftime('%d%m%Y'), day.strftime('%d%m%y'), f"{day.day}{day.month:02d}{day.year}"}
+
+
+def _union(boxes):
+    return [min(b[0] for b in boxes), min(b[1] for b in boxes), max(b[2] for b in boxes), max(b[3] for b in boxes)]
+
+
+def _overlaps(box, other, margin_x, margin_y):
+    return (box[0] - margin_x < other[2] and other[0] < box[2] + margin_x
+            and box[1] - margin_y < other[3] and other[1] < box[3] + margin_y)
+
+
+def _text_lines(page_words):
+    """Regroupe les mots d'une page par ligne de texte, dans l'ordre de lecture"""
+    lines = {}
+    for word in page_words:
+        lines.setdefault(word[6], []).append(word)
+    return sorted(lines.values(), key=lambda words: (min(w[3] for w in words), min(w[2] for w in words)))
+
+
+def _find_fields(words, data):
+    """Retrouve la position des valeurs validées parmi les mots de l'OCR complet"""
+    number = ''.join(c for c in (data.get('invoice_number') or '').upper() if c.isalnum())
+    date_digits = _date_variants(data.get('invoice_date'))
+    total = _parse_amount(str(data.get('total_amount') or ''))
+    line_totals = [_parse_amount(str(line.get('total_price') or '')) for line in data.get('lines', [])]
+    line_totals = [amount for amount in line_totals if amount]
+
+    found = {}
+    line_boxes = {}
+    for page_number, page_words in enumerate(words, start=1):
+        for line in _text_lines(page_words):
+            # Un montant peut être coupé en deux mots ("1 234,56")
+            candidates = [[w] for w in line] + [line[i:i + 2] for i in range(len(line) - 1)]
+            for candidate in candidates:
+                text = ''.join(w[0] for w in candidate)
+                box = _union([w[2:6] for w in candidate])
+                cleaned = ''.join(c for c in text.upper() if c.isalnum())
+                if number and cleaned == number and 'invoice_number' not in found:
+                    found['invoice_number'] = (page_number, box)
+                if date_digits and cleaned in date_digits and 'invoice_date' not in found:
+                    found['invoice_date'] = (page_number, box)
+                amount = _parse_amount(text)
+                if amount is None:
+                    continue
+                if total and abs(amount - total) < 0.005:
+                    # Le total est en général le dernier montant égal de la facture
+                    found['total_amount'] = (page_number, box)
+                elif any(abs(amount - line_total) < 0.005 for line_total in line_totals):
+                    line_boxes.setdefault(page_number, []).append(_union([w[2:6] for w in line]))
+
+    if len(line_boxes) == 1:
+        # Le tableau n'est appris que s'il tient sur une seule page
+        page_number, boxes = next(iter(line_boxes.items()))
+        found['lines'] = (page_number, _union(boxes))
+    return found
+
+
+def _merge_zone(zone, page_number, box):
+    if zone and zone['page'] == page_number and _overlaps(zone['box'], box, FIELD_MARGIN_X, FIELD_MARGIN_Y):
+        return {'page': page_number, 'box': [round(v, 4) for v in _union([zone['box'], box])], 'hits': zone['hits'] + 1}
+    # Première observation, ou la zone a changé de place : on repart de zéro
+    return {'page': page_number, 'box': [round(v, 4) for v in box], 'hits': 1}
+
+
+def learn_template(supplier, data):
+    """Met à jour le gabarit d'un fournisseur avec une facture validée.
+
+    Sans effet si le document n'a pas été lu en entier (upload lu par le
+    gabarit, fichier hérité) : les positions des mots ne sont alors pas connues.
+    """
+    digest = digest_from_reference(data.get('file_path'))
+    words = load_words(digest) if digest else None
+    if not words:
+        return
+    template = load_template(supplier) or {'pages': len(words), 'samples': 0, 'fields': {}}
+    if template['pages'] != len(words):
+        template = {'pages': len(words), 'samples': 0, 'fields': {}}
+
+    for field, (page_number, box) in _find_fields(words, data).items():
+        template['fields'][field] = _merge_zone(template['fields'].get(field), page_number, box)
+    template['samples'] += 1
+    supplier.layout_template = json.dumps(template)
+
+
+def is_ready(template, page_count):
+    """Un gabarit est utilisable quand toutes ses zones sont confirmées pour ce nombre de pages"""
+    if not template or template['pages'] != page_count:
+        return False
+    zones = template['fields']
+    return all(field in zones and zones[field]['hits'] >= MIN_HITS for field in FIELDS + ('lines',))
+
+
+def _zone_boxes(template):
+    """Zones à relire, en coordonnées relatives, marges comprises"""
+    zones = template['fields']
+    boxes = {}
+    for field in FIELDS:
+        left, top, right, bottom = zones[field]['box']
+        boxes[field] = (zones[field]['page'], [left - FIELD_MARGIN_X, top - FIELD_MARGIN_Y,
+                                               right + FIELD_MARGIN_X, bottom + FIELD_MARGIN_Y], FIELD_PSM)
+
+    # Le tableau s'étend jusqu'au total quand celui-ci le suit sur la même page (sinon jusqu'en bas) :
+    # une facture plus longue que d'habitude décale le total, dont la zone devient alors illisible
+    left, top, right, bottom = zones['lines']['box']
+    total = zones['total_amount']
+    end = 1.0
+    if total['page'] == zones['lines']['page'] and total['box'][1] > bottom:
+        end = total['box'][1]
+    boxes['lines'] = (zones['lines']['page'], [left - LINES_MARGIN, top - LINES_MARGIN, right + LINES_MARGIN, end], LINES_PSM)
+    return boxes
+
+
+def read_zones(template, raster_meta, languages):
+    """OCR des seules zones du gabarit.
+
+    Retourne ``{champ: {'text', 'confidence'}}`` et la part des pixels des pages
+    effectivement relue.
+    """
+    digest = raster_meta['digest']
+    results = {}
+    pixels = 0
+    for field, (page_number, box, psm) in _zone_boxes(template).items():
+        size = raster_meta['pages'][page_number - 1]
+        left, top = max(0.0, box[0]) * size['width'], max(0.0, box[1]) * size['height']
+        right, bottom = min(1.0, box[2]) * size['width'], min(1.0, box[3]) * size['height']
+        pixels += (right - left) * (bottom - top)
+        results[field] = ocr_region(page_path(digest, page_number), (int(left), int(top), int(right), int(bottom)),
+                                    psm=psm, lang=languages)
+    total_pixels = sum(page['width'] * page['height'] for page in raster_meta['pages'])
+    return results, round(pixels / total_pixels, 3) if total_pixels else 0.0
@@ -0,0 +1,206 @@
+"""Instrumentation des requêtes : durées, requêtes SQL et étapes du pipeline OCR.
+
+- ``init_app(app)`` installe les hooks Flask qui mesurent chaque requête HTTP,
+  et les événements SQLAlchemy qui comptent les requêtes SQL et leur durée ;
+- ``span(nom)`` chronomètre une étape (rastérisation, OCR, parsing...) et la
+  rattache à la requête en cours ;
+- ``measure_stream(générateur)`` reporte la mesure d'une réponse en flux
+  (Server-Sent Events) à la fin de son générateur ;
+- ``render_prometheus()`` sérialise les histogrammes au format texte
+  Prometheus, servi par ``/api/metrics``.
+
+Les métriques sont agrégées en mémoire, par processus : avec plusieurs workers,
+chaque worker expose ses propres compteurs.
+
+Si ``SLOW_REQUEST_THRESHOLD`` (secondes) est défini dans la config, les requêtes
+plus lentes sont journalisées avec le détail de leurs étapes.
+"""
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import current_app, g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 5000)
+
+
+class Histogram:
+    """Histogramme cumulatif à seaux fixes, au sens de Prometheus"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, upper_bound in enumerate(self.buckets):
+            if value <= upper_bound:
+                self.counts[i] += 1
+        self.count += 1
+        self.sum += value
+
+
+class MetricsRegistry:
+    """Registre des histogrammes, indexés par nom de métrique et labels"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}  # nom -> (aide, seaux, {labels: Histogram})
+
+    def register(self, name, help_text, buckets):
+        with self._lock:
+            self._metrics.setdefault(name, (help_text, buckets, {}))
+
+    def observe(self, name, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            _, buckets, series = self._metrics[name]
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def render(self):
+        lines = []
+        with self._lock:
+            for name, (help_text, _, series) in sorted(self._metrics.items()):
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} histogram")
+                for key, histogram in sorted(series.items()):
+                    labels = [f'{k}="{_escape(v)}"' for k, v in key]
+                    for upper_bound, count in zip(histogram.buckets, histogram.counts):
+                        bucket_labels = _labels(labels + ['le="%s"' % upper_bound])
+                        lines.append(f"{name}_bucket{bucket_labels} {count}")
+                    bucket_labels = _labels(labels + ['le="+Inf"'])
+                    lines.append(f"{name}_bucket{bucket_labels} {histogram.count}")
+                    lines.append(f"{name}_sum{_labels(labels)} {histogram.sum}")
+                    lines.append(f"{name}_count{_labels(labels)} {histogram.count}")
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels):
+    return '{' + ','.join(labels) + '}' if labels else ''
+
+
+registry = MetricsRegistry()
+registry.register('http_request_duration_seconds', "Durée des requêtes HTTP", DURATION_BUCKETS)
+registry.register('http_request_sql_queries', "Nombre de requêtes SQL par requête HTTP", COUNT_BUCKETS)
+registry.register('http_request_sql_duration_seconds', "Temps passé en SQL par requête HTTP", DURATION_BUCKETS)
+registry.register('pipeline_stage_duration_seconds', "Durée des étapes du pipeline de traitement", DURATION_BUCKETS)
+
+
+def render_prometheus():
+    """Retourne toutes les métriques au format texte Prometheus"""
+    return registry.render()
+
+
+def _request_state():
+    if has_app_context():
+        return g.get('_metrics')
+    return None
+
+
+@contextmanager
+def span(name):
+    """Chronomètre une étape nommée et l'ajoute au détail de la requête en cours"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - started
+        registry.observe('pipeline_stage_duration_seconds', duration, stage=name)
+        state = _request_state()
+        if state is not None:
+            state['spans'].append((name, duration))
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._metrics_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, '_metrics_started', None)
+    state = _request_state()
+    if state is not None and started is not None:
+        state['sql_queries'] += 1
+        state['sql_duration'] += time.perf_counter() - started
+
+
+def _before_request():
+    g._metrics = {'started': time.perf_counter(), 'sql_queries': 0, 'sql_duration': 0.0, 'spans': []}
+
+
+def _record_request(state, status):
+    duration = time.perf_counter() - state['started']
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    registry.observe('http_request_duration_seconds', duration,
+                     method=request.method, endpoint=endpoint, status=status)
+    registry.observe('http_request_sql_queries', state['sql_queries'], endpoint=endpoint)
+    registry.observe('http_request_sql_duration_seconds', state['sql_duration'], endpoint=endpoint)
+
+    threshold = current_app.config.get('SLOW_REQUEST_THRESHOLD')
+    if threshold is not None and duration >= float(threshold):
+        current_app.logger.warning("Requête lente: %s", json.dumps({
+            'method': request.method,
+            'path': request.full_path.rstrip('?'),
+            'status': status,
+            'duration': round(duration, 4),
+            'sql_queries': state['sql_queries'],
+            'sql_duration': round(state['sql_duration'], 4),
+            'spans': [{'name': name, 'duration': round(d, 4)} for name, d in state['spans']],
+        }))
+
+
+def _after_request(response):
+    state = g.get('_metrics')
+    if state is None:
+        return response
+    if state.get('streamed'):
+        # Réponse en flux : mesurée quand son générateur se termine (voir measure_stream)
+        state['status'] = response.status_code
+        return response
+
+    g.pop('_metrics')
+    _record_request(state, response.status_code)
+    return response
+
+
+def measure_stream(generator):
+    """Enveloppe le générateur d'une réponse en flux (à passer ensuite à stream_with_context).
+
+    La requête est mesurée à la fin du flux, et non au retour de la vue : sa
+    durée et le détail de ses étapes comprennent le travail fait pendant l'envoi.
+    """
+    state = _request_state()
+    if state is not None:
+        state['streamed'] = True
+
+    def measured():
+        try:
+            yield from generator
+        finally:
+            state = g.pop('_metrics', None)
+            if state is not None:
+                _record_request(state, state.get('status', 200))
+
+    return measured()
+
+
+def init_app(app):
+    """Active l'instrumentation des requêtes sur l'application"""
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    # Écouteurs posés sur la classe Engine : ils couvrent tous les moteurs, même créés plus tard
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
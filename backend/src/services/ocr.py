@@ -0,0 +1,90 @@
+"""Outils OCR (Tesseract) communs : texte et mots positionnés, relecture d'une zone de page.
+
+pytesseract, pdf2image et PIL ne sont importés qu'à la première utilisation :
+un worker qui ne sert que des requêtes d'analyse démarre sans les charger.
+"""
+import importlib
+
+from src.services.metrics import span
+
+
+def lazy_import(name):
+    """Importe un module lourd à la première demande (les suivantes passent par sys.modules)"""
+    return importlib.import_module(name)
+
+
+def pytesseract():
+    return lazy_import('pytesseract')
+
+
+def pdf2image():
+    return lazy_import('pdf2image')
+
+
+def pil_image():
+    return lazy_import('PIL.Image')
+
+
+def data_to_text(data):
+    """Reconstruit le texte ligne par ligne à partir de la sortie image_to_data"""
+    lines = {}
+    confidences = []
+    for i, word in enumerate(data['text']):
+        if not word.strip():
+            continue
+        key = (data['block_num'][i], data['par_num'][i], data['line_num'][i])
+        lines.setdefault(key, []).append(word)
+        confidence = float(data['conf'][i])
+        if confidence >= 0:
+            confidences.append(confidence)
+    text = '\n'.join(' '.join(words) for _, words in sorted(lines.items()))
+    confidence = sum(confidences) / len(confidences) / 100 if confidences else 0.0
+    return text, confidence
+
+
+def data_to_words(data, width, height):
+    """Mots reconnus avec leur boîte en coordonnées relatives (0-1) à la page.
+
+    Chaque mot est une liste ``[texte, confiance 0-1, gauche, haut, droite, bas,
+    ligne]`` ; ``ligne`` regroupe les mots d'une même ligne de texte.
+    """
+    words = []
+    for i, word in enumerate(data['text']):
+        if not word.strip():
+            continue
+        left, top = data['left'][i], data['top'][i]
+        words.append([
+            word,
+            max(0.0, float(data['conf'][i])) / 100,
+            round(left / width, 4),
+            round(top / height, 4),
+            round((left + data['width'][i]) / width, 4),
+            round((top + data['height'][i]) / height, 4),
+            f"{data['block_num'][i]}.{data['par_num'][i]}.{data['line_num'][i]}",
+        ])
+    return words
+
+
+def ocr_region(image_path, box, psm=7, lang='fra+eng', min_height=48):
+    """Relit une zone d'une page avec des réglages adaptés à une ligne isolée.
+
+    ``box`` est un tuple (gauche, haut, droite, bas) en pixels. La zone est
+    passée en niveaux de gris, contrastée, agrandie si le texte est trop petit
+    pour Tesseract et entourée d'une marge blanche.
+    """
+    image_ops = lazy_import('PIL.ImageOps')
+    image = pil_image().open(image_path)
+    left, top, right, bottom = box
+    region = image.crop((max(0, left), max(0, top), min(image.width, right), min(image.height, bottom)))
+    region = image_ops.autocontrast(region.convert('L'))
+    if region.height < min_height:
+        ratio = min_height / max(1, region.height)
+        region = region.resize((int(region.width * ratio), min_height), pil_image().LANCZOS)
+    region = image_ops.expand(region, border=10, fill=255)
+
+    with span('ocr_region'):
+        data = pytesseract().image_to_data(
+            region, lang=lang, config=f'--psm {psm}', output_type=pytesseract().Output.DICT
+        )
+    text, confidence = data_to_text(data)
+    return {'text': text, 'confidence': round(confidence, 3)}
@@ -0,0 +1,214 @@
+"""Profils OCR par fournisseur.
+
+La plupart des fournisseurs envoient toujours des factures en français, avec
+la même mise en page. Plutôt que de lancer Tesseract avec deux modèles de
+langue (``fra+eng``) sur chaque page, on :
+
+1. lit rapidement le bandeau d'en-tête de la première page (français seul,
+   zone réduite) pour reconnaître le fournisseur ;
+2. applique son profil (langues, PSM, DPI, prétraitement) aux pages ;
+3. affine le profil à chaque facture validée, à partir des statistiques
+   mesurées pendant l'OCR (part de mots anglais, confiance moyenne).
+"""
+import re
+import unicodedata
+from difflib import SequenceMatcher
+
+from src.models.invoice import Supplier
+from src.services.metrics import span
+from src.services.ocr import data_to_text, data_to_words, lazy_import, pil_image, pytesseract
+
+DEFAULT_PROFILE = {'languages': 'fra+eng', 'psm': 3, 'dpi': None, 'preprocess': 'none'}
+
+# Valeurs acceptées pour un profil corrigé à la main
+LANGUAGES_PATTERN = re.compile(r'^[a-z_]{3,}(\+[a-z_]{3,})*$')  # modèles Tesseract : fra, fra+eng...
+PSM_RANGE = (0, 13)
+DPI_RANGE = (72, 600)
+PREPROCESS_MODES = ('none', 'grayscale', 'binarize')
+
+# Bandeau d'en-tête lu pour la détection : haut de la première page, en français seul
+HEADER_FRACTION = 0.2
+HEADER_LANGUAGES = 'fra'
+SUPPLIER_MATCH_THRESHOLD = 0.8
+
+# Apprentissage : moyenne glissante et nombre de factures avant de restreindre le profil
+LEARNING_RATE = 0.3
+MIN_SAMPLES = 3
+FRENCH_ONLY_MAX_ENGLISH_RATIO = 0.05
+BILINGUAL_MIN_ENGLISH_RATIO = 0.15
+FAST_DPI = 150
+HIGH_CONFIDENCE = 0.9
+LOW_CONFIDENCE = 0.6
+
+FRENCH_WORDS = {
+    'le', 'la', 'les', 'de', 'des', 'du', 'et', 'en', 'au', 'aux', 'pour', 'sur', 'par',
+    'facture', 'total', 'montant', 'quantité', 'prix', 'date', 'tva', 'ttc', 'ht', 'net', 'à', 'payer',
+}
+ENGLISH_WORDS = {
+    'the', 'of', 'and', 'to', 'for', 'on', 'by', 'with', 'invoice', 'amount',
+    'quantity', 'price', 'due', 'tax', 'vat', 'subtotal', 'payment', 'description',
+}
+
+
+def _normalize(value):
+    value = unicodedata.normalize('NFKD', value).encode('ascii', 'ignore').decode('ascii')
+    return re.sub(r'[^A-Z0-9 ]+', ' ', value.upper()).split()
+
+
+def english_ratio(text):
+    """Part des mots outils anglais parmi les mots outils reconnus du texte"""
+    words = re.findall(r'\w+', text.lower())
+    french = sum(1 for word in words if word in FRENCH_WORDS)
+    english = sum(1 for word in words if word in ENGLISH_WORDS)
+    return english / (french + english) if french + english else 0.0
+
+
+def match_supplier(header_text, suppliers):
+    """Retrouve le fournisseur dont le nom apparaît dans le texte d'en-tête.
+
+    Parmi les noms reconnus, le plus long l'emporte : un nom court (le client
+    lui-même, souvent imprimé dans l'en-tête) ne masque pas le vrai fournisseur.
+    """
+    header_words = _normalize(header_text)
+    matches = []
+    best_score = 0.0
+    for supplier in suppliers:
+        name_words = _normalize(supplier.name or '')
+        if not name_words:
+            continue
+        # Compare le nom à chaque fenêtre de même longueur dans l'en-tête (tolère les fautes OCR)
+        size = len(name_words)
+        name = ' '.join(name_words)
+        score = max(
+            SequenceMatcher(None, name, ' '.join(header_words[start:start + size])).ratio()
+            for start in range(max(1, len(header_words) - size + 1))
+        )
+        best_score = max(best_score, score)
+        if score >= SUPPLIER_MATCH_THRESHOLD:
+            matches.append((len(name), score, supplier))
+    if not matches:
+        return None, best_score
+    _, score, supplier = max(matches, key=lambda match: (match[0], match[1]))
+    return supplier, score
+
+
+def detect_supplier(first_page_path):
+    """OCR rapide du bandeau d'en-tête puis rapprochement avec les fournisseurs connus"""
+    with span('supplier_detection'):
+        image = pil_image().open(first_page_path)
+        header = image.crop((0, 0, image.width, int(image.height * HEADER_FRACTION))).convert('L')
+        header_text = pytesseract().image_to_string(header, lang=HEADER_LANGUAGES, config='--psm 6')
+        suppliers = Supplier.query.all()
+        supplier, score = match_supplier(header_text, suppliers)
+    return supplier, score
+
+
+def profile_for(supplier):
+    """Profil effectif d'un fournisseur (réglages par défaut pour les champs non appris)"""
+    profile = dict(DEFAULT_PROFILE)
+    if supplier is not None:
+        for key, value in (('languages', supplier.ocr_languages), ('psm', supplier.ocr_psm),
+                           ('dpi', supplier.ocr_dpi), ('preprocess', supplier.ocr_preprocess)):
+            if value is not None:
+                profile[key] = value
+    return profile
+
+
+def _preprocess(image, preprocess):
+    if preprocess == 'grayscale':
+        return image.convert('L')
+    if preprocess == 'binarize':
+        image = lazy_import('PIL.ImageOps').autocontrast(image.convert('L'))
+        return image.point(lambda value: 255 if value > 160 else 0)
+    return image
+
+
+def ocr_page(path, profile, raster_dpi):
+    """OCR d'une page rastérisée avec un profil ; retourne (texte, confiance 0-1, mots).
+
+    raster_dpi est la résolution de la page (None si inconnue).
+    """
+    image = pil_image().open(path)
+    dpi = profile.get('dpi')
+    if dpi and raster_dpi and dpi < raster_dpi:
+        # Moins de pixels, OCR plus rapide : seulement vers le bas, le cache est à raster_dpi.
+        # Résolution inconnue (image sans DPI) : on ne réduit pas, le scan est peut-être déjà faible
+        ratio = dpi / raster_dpi
+        image = image.resize((int(image.width * ratio), int(image.height * ratio)), pil_image().LANCZOS)
+    image = _preprocess(image, profile.get('preprocess'))
+
+    with span('ocr'):
+        data = pytesseract().image_to_data(
+            image, lang=profile['languages'], config=f"--psm {profile['psm']}",
+            output_type=pytesseract().Output.DICT
+        )
+    text, confidence = data_to_text(data)
+    return text, confidence, data_to_words(data, image.width, image.height)
+
+
+def ocr_pages(paths, profile, raster_dpi):
+    """OCR des pages une à une : générateur de (texte, confiance 0-1, mots) par page"""
+    for path in paths:
+        yield ocr_page(path, profile, raster_dpi)
+
+
+def summarize_ocr(text, confidences, profile):
+    """Statistiques d'OCR d'un document (texte complet, confiance de chaque page)"""
+    return {
+        'profile': profile,
+        'confidence': round(sum(confidences) / len(confidences), 3) if confidences else 0.0,
+        'english_ratio': round(english_ratio(text), 3),
+    }
+
+
+def _moving_average(previous, value):
+    if previous is None:
+        return value
+    return previous + LEARNING_RATE * (value - previous)
+
+
+def _ratio(value):
+    """Valeur entre 0 et 1 envoyée par le client, None si absente ou invalide"""
+    if isinstance(value, bool):
+        return None
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return value if 0.0 <= value <= 1.0 else None  # exclut aussi NaN
+
+
+def update_profile(supplier, ocr_stats):
+    """Affine le profil d'un fournisseur avec les statistiques d'une facture validée.
+
+    Les statistiques viennent du client : les valeurs invalides sont ignorées.
+    """
+    if not isinstance(ocr_stats, dict):
+        return
+    english = _ratio(ocr_stats.get('english_ratio'))
+    confidence = _ratio(ocr_stats.get('confidence'))
+    if english is None and confidence is None:
+        return
+    supplier.ocr_samples = (supplier.ocr_samples or 0) + 1
+    if english is not None:
+        supplier.ocr_english_ratio = _moving_average(supplier.ocr_english_ratio, english)
+    if confidence is not None:
+        supplier.ocr_mean_confidence = _moving_average(supplier.ocr_mean_confidence, confidence)
+
+    if supplier.ocr_samples < MIN_SAMPLES:
+        return
+
+    # Langues : un seul modèle quand les factures sont toujours en français
+    if supplier.ocr_english_ratio is not None:
+        if supplier.ocr_english_ratio <= FRENCH_ONLY_MAX_ENGLISH_RATIO:
+            supplier.ocr_languages = 'fra'
+        elif supplier.ocr_english_ratio >= BILINGUAL_MIN_ENGLISH_RATIO:
+            supplier.ocr_languages = 'fra+eng'
+
+    # Résolution et prétraitement selon la qualité observée
+    if supplier.ocr_mean_confidence is not None:
+        if supplier.ocr_mean_confidence >= HIGH_CONFIDENCE:
+            supplier.ocr_dpi = FAST_DPI
+        elif supplier.ocr_mean_confidence < LOW_CONFIDENCE:
+            supplier.ocr_dpi = None
+            supplier.ocr_preprocess = 'binarize'
@@ -0,0 +1,195 @@
+"""Cache disque des pages rastérisées des documents uploadés.
+
+Chaque document (identifié par son empreinte, voir ``storage.py``) n'est
+rastérisé qu'une fois ; ses pages sont conservées sous :
+
+    <UPLOAD_FOLDER>/rasters/<empreinte>/page-0001.png   (résolution RASTER_DPI)
+    <UPLOAD_FOLDER>/rasters/<empreinte>/thumb-0001.jpg  (aperçu pour l'interface)
+    <UPLOAD_FOLDER>/rasters/<empreinte>/meta.json
+    <UPLOAD_FOLDER>/rasters/<empreinte>/words.json      (mots positionnés de l'OCR complet)
+
+L'OCR complet, la relecture d'une zone et les aperçus repartent de ces pages
+au lieu de reconvertir le PDF.
+"""
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from flask import current_app
+
+from src.services.metrics import span
+from src.services.ocr import pdf2image, pil_image
+from src.services.storage import digest_from_reference, get_upload_folder, resolve_path
+
+RASTERS_DIR = 'rasters'
+DEFAULT_DPI = 200
+THUMBNAIL_WIDTH = 300
+
+
+def _raster_dir(digest):
+    return os.path.join(get_upload_folder(), RASTERS_DIR, digest)
+
+
+def page_filename(page_number):
+    return f"page-{page_number:04d}.png"
+
+
+def thumbnail_filename(page_number):
+    return f"thumb-{page_number:04d}.jpg"
+
+
+def load_meta(digest):
+    """Métadonnées du cache d'un document (None s'il n'a pas encore été rastérisé)"""
+    meta_path = os.path.join(_raster_dir(digest), 'meta.json')
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path) as f:
+        return json.load(f)
+
+
+def image_dpi(image):
+    """Résolution enregistrée dans une image (None si absente ou invalide)"""
+    try:
+        dpi = round(float(image.info['dpi'][0]))
+    except (KeyError, TypeError, ValueError, IndexError):
+        return None
+    return dpi if dpi > 0 else None
+
+
+def _save_atomically(image, path, **options):
+    """Écrit une image sous un nom temporaire puis la renomme : un lecteur ne voit jamais de fichier partiel"""
+    extension = os.path.splitext(path)[1]
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=extension)
+    os.close(fd)
+    try:
+        image.save(tmp_path, **options)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def rasterize_pages(reference):
+    """Rastérise un document stocké (une seule fois), page par page.
+
+    Générateur : produit les métadonnées (voir rasterize) après chaque page
+    rendue, ``pages`` ne listant que les pages déjà prêtes et ``page_count``
+    donnant leur nombre total. Les PDF sont rendus une page à la fois
+    (``first_page``/``last_page``) : l'appelant peut traiter la première page
+    sans attendre les suivantes. Un document déjà en cache est produit en une
+    seule fois. ``meta.json`` n'est écrit qu'à la fin : un cache sans lui est
+    incomplet et sera refait.
+    """
+    digest = digest_from_reference(reference)
+    if digest is None:
+        raise ValueError(f"Référence sans empreinte (fichier hérité) : {reference}")
+    is_pdf = reference.lower().endswith('.pdf')
+    meta = load_meta(digest)
+    if meta is not None:
+        # Marque le cache comme utilisé, pour purge_old_rasters
+        os.utime(os.path.join(_raster_dir(digest), 'meta.json'))
+        meta['page_count'] = len(meta['pages'])  # cache complet : toutes les pages sont prêtes
+        yield meta
+        return
+
+    source_path = resolve_path(reference)
+    if source_path is None:
+        raise FileNotFoundError(reference)
+
+    if is_pdf:
+        dpi = current_app.config.get('RASTER_DPI', DEFAULT_DPI)
+        page_count = pdf2image().pdfinfo_from_path(source_path)['Pages']
+
+        def render(number):
+            return pdf2image().convert_from_path(source_path, dpi=dpi, first_page=number, last_page=number)[0]
+    else:
+        image = pil_image().open(source_path)
+        dpi = image_dpi(image)
+        page_count = 1
+
+        def render(number):
+            image.seek(0)  # première image des GIF animés
+            return image.convert('RGB')
+
+    # Chaque fichier est écrit de façon atomique : deux workers qui rastérisent
+    # le même document en même temps écrivent les mêmes pages
+    directory = _raster_dir(digest)
+    os.makedirs(directory, exist_ok=True)
+    meta = {'digest': digest, 'dpi': dpi, 'dpi_source': 'render' if is_pdf else 'image',
+            'page_count': page_count, 'pages': []}
+    for number in range(1, page_count + 1):
+        with span('rasterize'):
+            image = render(number)
+            _save_atomically(image, os.path.join(directory, page_filename(number)))
+            thumbnail = image.copy()
+            thumbnail.thumbnail((THUMBNAIL_WIDTH, THUMBNAIL_WIDTH * 2))
+            _save_atomically(thumbnail.convert('RGB'), os.path.join(directory, thumbnail_filename(number)), quality=80)
+        meta['pages'].append({'page': number, 'width': image.width, 'height': image.height})
+        yield meta
+
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.json')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, os.path.join(directory, 'meta.json'))
+
+
+def rasterize(reference):
+    """Rastérise un document stocké (une seule fois) et retourne ses métadonnées.
+
+    Les métadonnées contiennent l'empreinte du document, la résolution et, pour
+    chaque page, son numéro et ses dimensions en pixels. Les PDF sont rendus à
+    RASTER_DPI ; une image garde ses pixels et sa résolution propre (None si
+    elle ne l'indique pas).
+    """
+    meta = None
+    for meta in rasterize_pages(reference):
+        pass
+    return meta
+
+
+def save_words(digest, words):
+    """Conserve les mots positionnés de l'OCR complet (une liste par page)"""
+    path = os.path.join(_raster_dir(digest), 'words.json')
+    fd, tmp_path = tempfile.mkstemp(dir=_raster_dir(digest))
+    with os.fdopen(fd, 'w') as f:
+        json.dump(words, f)
+    os.replace(tmp_path, path)
+
+
+def load_words(digest):
+    """Mots positionnés de l'OCR complet d'un document (None s'il n'a pas été lu en entier)"""
+    path = os.path.join(_raster_dir(digest), 'words.json')
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def page_path(digest, page_number):
+    return os.path.join(_raster_dir(digest), page_filename(page_number))
+
+
+def thumbnail_path(digest, page_number):
+    return os.path.join(_raster_dir(digest), thumbnail_filename(page_number))
+
+
+def page_paths(meta):
+    return [page_path(meta['digest'], page['page']) for page in meta['pages']]
+
+
+def purge_old_rasters(max_age_days=30):
+    """Supprime les caches de pages non utilisés depuis ``max_age_days`` jours"""
+    root = os.path.join(get_upload_folder(), RASTERS_DIR)
+    cutoff = time.time() - max_age_days * 86400
+    purged = 0
+    if os.path.isdir(root):
+        for digest in os.listdir(root):
+            directory = os.path.join(root, digest)
+            meta_path = os.path.join(directory, 'meta.json')
+            last_used = os.path.getmtime(meta_path if os.path.exists(meta_path) else directory)
+            if last_used < cutoff:
+                shutil.rmtree(directory, ignore_errors=True)
+                purged += 1
+    return purged
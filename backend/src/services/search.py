@@ -0,0 +1,308 @@
+"""Recherche plein texte (SQLite FTS5) dans les lignes et le texte OCR des factures.
+
+Deux index à contenu externe, tenus à jour par des triggers :
+
+- ``invoice_line_fts`` sur ``invoice_line.raw_description`` ;
+- ``invoice_fts`` sur ``invoice.invoice_number`` et ``invoice.ocr_text``.
+
+Le tokenizer ``unicode61`` ignore la casse et les accents : « granules »
+trouve « Granulés ». Les résultats sont classés par pertinence (bm25).
+"""
+import re
+import unicodedata
+
+from sqlalchemy import text
+
+from src.models.invoice import Invoice, InvoiceLine
+
+SEARCH_SCHEMA = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS invoice_line_fts USING fts5(
+        raw_description, content='invoice_line', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2')""",
+    """CREATE TRIGGER IF NOT EXISTS invoice_line_fts_insert AFTER INSERT ON invoice_line BEGIN
+        INSERT INTO invoice_line_fts(rowid, raw_description) VALUES (new.id, new.raw_description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS invoice_line_fts_delete AFTER DELETE ON invoice_line BEGIN
+        INSERT INTO invoice_line_fts(invoice_line_fts, rowid, raw_description)
+        VALUES ('delete', old.id, old.raw_description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS invoice_line_fts_update AFTER UPDATE OF raw_description ON invoice_line BEGIN
+        INSERT INTO invoice_line_fts(invoice_line_fts, rowid, raw_description)
+        VALUES ('delete', old.id, old.raw_description);
+        INSERT INTO invoice_line_fts(rowid, raw_description) VALUES (new.id, new.raw_description);
+    END""",
+    """CREATE VIRTUAL TABLE IF NOT EXISTS invoice_fts USING fts5(
+        invoice_number, ocr_text, content='invoice', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2')""",
+    """CREATE TRIGGER IF NOT EXISTS invoice_fts_insert AFTER INSERT ON invoice BEGIN
+        INSERT INTO invoice_fts(rowid, invoice_number, ocr_text) VALUES (new.id, new.invoice_number, new.ocr_text);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS invoice_fts_delete AFTER DELETE ON invoice BEGIN
+        INSERT INTO invoice_fts(invoice_fts, rowid, invoice_number, ocr_text)
+        VALUES ('delete', old.id, old.invoice_number, old.ocr_text);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS invoice_fts_update AFTER UPDATE OF invoice_number, ocr_text ON invoice BEGIN
+        INSERT INTO invoice_fts(invoice_fts, rowid, invoice_number, ocr_text)
+        VALUES ('delete', old.id, old.invoice_number, old.ocr_text);
+        INSERT INTO invoice_fts(rowid, invoice_number, ocr_text) VALUES (new.id, new.invoice_number, new.ocr_text);
+    END""",
+]
+
+# Réindexe tout le contenu existant (création de l'index sur une base déjà remplie, chargement en masse)
+REBUILD_SEARCH_INDEX = [
+    "INSERT INTO invoice_line_fts(invoice_line_fts) VALUES ('rebuild')",
+    "INSERT INTO invoice_fts(invoice_fts) VALUES ('rebuild')",
+]
+
+# Au-delà de ce nombre de correspondances, le classement bm25 (calculé sur toutes) coûte
+# des centaines de millisecondes pour un ordre peu parlant : on trie alors par récence
+RELEVANCE_LIMIT = 10000
+SNIPPET_WORDS = 12
+
+SCOPES = ('all', 'lines', 'invoices')
+
+# Une source par index : (type de résultat, table FTS, jointure vers la facture, bm25)
+SOURCES = {
+    'lines': ('line', 'invoice_line_fts',
+              'CROSS JOIN invoice_line ON invoice_line.id = invoice_line_fts.rowid '
+              'CROSS JOIN invoice ON invoice.id = invoice_line.invoice_id',
+              'bm25(invoice_line_fts)'),
+    'invoices': ('invoice', 'invoice_fts',
+                 'CROSS JOIN invoice ON invoice.id = invoice_fts.rowid',
+                 'bm25(invoice_fts, 2.0, 1.0)'),
+}
+
+# CROSS JOIN impose l'ordre des jointures : l'index plein texte pilote la requête
+MATCH_FILTERS = """
+  AND (:supplier_id IS NULL OR invoice.supplier_id = :supplier_id)
+  AND (:date_from IS NULL OR invoice.invoice_date >= :date_from)
+  AND (:date_to IS NULL OR invoice.invoice_date <= :date_to)
+"""
+
+SOURCE_QUERY = """
+SELECT '{type}' AS type, {table}.rowid AS id, {rank} AS rank,
+       invoice.id AS invoice_id, invoice.invoice_number, invoice.invoice_date,
+       invoice.supplier_id, supplier.name AS supplier_name
+FROM {table} {join}
+CROSS JOIN supplier ON supplier.id = invoice.supplier_id
+WHERE {table} MATCH :query
+""" + MATCH_FILTERS
+
+# Classement ``recent`` : le tri porte sur toutes les correspondances, il ne lit que
+# les identifiants ; facture et fournisseur ne sont joints que pour la page retenue
+RECENT_QUERY = """
+SELECT recent.type, recent.id, 0.0 AS rank,
+       invoice.id AS invoice_id, invoice.invoice_number, invoice.invoice_date,
+       invoice.supplier_id, supplier.name AS supplier_name
+FROM (
+    SELECT '{type}' AS type, {table}.rowid AS id, invoice.id AS invoice_id
+    FROM {table} {join}
+    WHERE {table} MATCH :query {filters}
+    ORDER BY invoice_id DESC, id DESC LIMIT :limit
+) AS recent
+CROSS JOIN invoice ON invoice.id = recent.invoice_id
+CROSS JOIN supplier ON supplier.id = invoice.supplier_id
+"""
+
+
+def _sources(scope):
+    return [SOURCES[name] for name in ('lines', 'invoices') if scope in ('all', name)]
+
+
+def _source_query(source):
+    result_type, table, join, bm25 = source
+    return SOURCE_QUERY.format(type=result_type, table=table, join=join, rank=bm25)
+
+
+def _recent_query(source):
+    result_type, table, join, _ = source
+    return RECENT_QUERY.format(type=result_type, table=table, join=join, filters=MATCH_FILTERS)
+
+
+def _recent_key(row):
+    """Clé du classement ``recent`` : facture la plus récente, la facture avant ses lignes"""
+    return row['invoice_id'], row['type'] == 'invoice', row['id']
+
+
+# Index plein texte et table de contenu dont il reprend les lignes
+INDEXED_TABLES = {'invoice_line_fts': 'invoice_line', 'invoice_fts': 'invoice'}
+SEARCH_TRIGGERS = [f"{fts}_{event}" for fts in INDEXED_TABLES for event in ('insert', 'delete', 'update')]
+
+
+def _index_is_stale(session):
+    """Vrai si l'index ne reflète plus ses tables de contenu.
+
+    C'est le cas s'il n'existe pas encore, ou si un trigger manque : une table
+    de contenu recréée (db.drop_all() puis db.create_all()) perd ses triggers
+    alors que l'index garde les rowids des anciennes lignes. Sinon, le nombre
+    de documents indexés (table ``_docsize``) est comparé à celui des lignes.
+    """
+    existing = {row[0] for row in session.execute(
+        text("SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger')")
+    )}
+    if any(fts not in existing for fts in INDEXED_TABLES) or any(t not in existing for t in SEARCH_TRIGGERS):
+        return True
+    return any(
+        session.execute(text(f"SELECT count(*) FROM {fts}_docsize")).scalar()
+        != session.execute(text(f"SELECT count(*) FROM {content}")).scalar()
+        for fts, content in INDEXED_TABLES.items()
+    )
+
+
+def create_search_index(session):
+    """Crée les index plein texte et leurs triggers s'ils n'existent pas.
+
+    Réindexe tout le contenu si l'index vient d'être créé ou n'est plus à jour
+    (voir _index_is_stale). Retourne True si l'index a été reconstruit.
+    """
+    stale = _index_is_stale(session)
+    for statement in SEARCH_SCHEMA:
+        session.execute(text(statement))
+    if stale:
+        for statement in REBUILD_SEARCH_INDEX:
+            session.execute(text(statement))
+    session.commit()
+    return stale
+
+
+def query_words(query):
+    return re.findall(r'\w+', query or '')
+
+
+def to_match_query(query):
+    """Transforme une saisie libre en requête FTS5 sûre (tous les mots, le dernier en préfixe)"""
+    words = query_words(query)
+    if not words:
+        return None
+    return ' '.join(f'"{word}"' for word in words) + '*'
+
+
+def _fold(value):
+    value = unicodedata.normalize('NFKD', value.lower())
+    return ''.join(c for c in value if not unicodedata.combining(c))
+
+
+def make_snippet(value, words, size=SNIPPET_WORDS):
+    """Extrait autour de la première correspondance, mots trouvés entre <mark>.
+
+    Même règle que la requête FTS (casse et accents ignorés, dernier mot en
+    préfixe) : seul le texte des résultats de la page est parcouru.
+    """
+    if not value:
+        return ''
+    folded = [_fold(word) for word in words]
+    tokens = list(re.finditer(r'\w+', value))
+
+    def matches(token):
+        token = _fold(token.group())
+        return token in folded[:-1] or token.startswith(folded[-1]) if folded else False
+
+    hits = [i for i, token in enumerate(tokens) if matches(token)]
+    first = max(0, hits[0] - size // 4) if hits else 0
+    window = tokens[first:first + size]
+    if not window:
+        return value[:200]
+
+    parts, position = [], window[0].start()
+    for token in window:
+        parts.append(value[position:token.start()])
+        parts.append(f"<mark>{token.group()}</mark>" if matches(token) else token.group())
+        position = token.end()
+    snippet = ''.join(parts)
+    if first > 0:
+        snippet = '…' + snippet
+    if first + size < len(tokens):
+        snippet += '…'
+    return snippet
+
+
+def _attach_snippets(session, results, words):
+    line_ids = [r['line_id'] for r in results if r['type'] == 'line']
+    invoice_ids = [r['invoice_id'] for r in results if r['type'] == 'invoice']
+    texts = {}
+    if line_ids:
+        for row in session.query(InvoiceLine.id, InvoiceLine.raw_description).filter(InvoiceLine.id.in_(line_ids)):
+            texts[('line', row.id)] = row.raw_description
+    if invoice_ids:
+        for row in session.query(Invoice.id, Invoice.invoice_number, Invoice.ocr_text).filter(Invoice.id.in_(invoice_ids)):
+            texts[('invoice', row.id)] = f"{row.invoice_number}\n{row.ocr_text or ''}"
+    for result in results:
+        key = ('line', result['line_id']) if result['type'] == 'line' else ('invoice', result['invoice_id'])
+        result['snippet'] = make_snippet(texts.get(key), words)
+
+
+def search(session, query, scope='all', supplier_id=None, date_from=None, date_to=None, page=1, per_page=20):
+    """Recherche plein texte paginée.
+
+    Retourne ``(résultats, total, classement)``. Le classement vaut
+    ``relevance`` (bm25 dans chaque index, lignes et factures entrelacées)
+    tant que la requête trouve au plus RELEVANCE_LIMIT correspondances,
+    ``recent`` (dernières factures enregistrées d'abord) au-delà ; le total
+    est alors inconnu (None) si des filtres sont appliqués.
+    """
+    match_query = to_match_query(query)
+    if match_query is None:
+        return [], 0, 'relevance'
+    sources = _sources(scope)
+    params = {
+        'query': match_query,
+        'supplier_id': supplier_id,
+        'date_from': date_from.isoformat() if date_from else None,
+        'date_to': date_to.isoformat() if date_to else None,
+    }
+    offset = (page - 1) * per_page
+    filtered = supplier_id is not None or date_from is not None or date_to is not None
+
+    # Compter les correspondances ne lit que les listes de l'index (quelques millisecondes)
+    matches = sum(
+        session.execute(text(f"SELECT count(*) FROM {table} WHERE {table} MATCH :query"), params).scalar()
+        for _, table, _, _ in sources
+    )
+
+    if matches <= RELEVANCE_LIMIT:
+        # Les scores bm25 de deux index ne se comparent pas : chaque source est classée
+        # séparément, puis les sources sont entrelacées par rang (1er de chaque, puis 2e...)
+        ranking = 'relevance'
+        sql = ' UNION ALL '.join(
+            f"SELECT *, {order} AS source, ROW_NUMBER() OVER (ORDER BY rank, id) AS position "
+            f"FROM ({_source_query(source)})"
+            for order, source in enumerate(sources)
+        )
+        rows = session.execute(
+            text(f"SELECT *, COUNT(*) OVER () AS total FROM ({sql}) "
+                 f"ORDER BY position, source LIMIT :limit OFFSET :offset"),
+            dict(params, limit=per_page, offset=offset)
+        ).mappings().all()
+        if rows:
+            total = rows[0]['total']
+        elif filtered:
+            # Page au-delà des résultats : le total reste utile pour revenir en arrière
+            total = session.execute(text(f"SELECT count(*) FROM ({sql})"), params).scalar()
+        else:
+            total = matches
+    else:
+        # Même ordre dans chaque source et à la fusion (voir _recent_key) : les offset + per_page
+        # premiers de chaque source suffisent pour paginer sans trou ni doublon
+        ranking = 'recent'
+        rows = []
+        for source in sources:
+            rows.extend(session.execute(
+                text(_recent_query(source)),
+                dict(params, limit=offset + per_page)
+            ).mappings().all())
+        rows.sort(key=_recent_key, reverse=True)
+        rows = rows[offset:offset + per_page]
+        total = None if filtered else matches
+
+    results = [{
+        'type': row['type'],
+        'invoice_id': row['invoice_id'],
+        'line_id': row['id'] if row['type'] == 'line' else None,
+        'invoice_number': row['invoice_number'],
+        'invoice_date': row['invoice_date'],
+        'supplier_id': row['supplier_id'],
+        'supplier_name': row['supplier_name'],
+        'score': round(-row['rank'], 4) if ranking == 'relevance' else None,
+    } for row in rows]
+    _attach_snippets(session, results, query_words(query))
+    return results, total, ranking
@@ -0,0 +1,176 @@
+"""Copie en lecture seule de la base, servie aux rapports d'analyse.
+
+Les rapports lourds (volatilité, synthèse produits...) parcourent beaucoup de
+lignes. Sur la base principale, leurs transactions de lecture retardent les
+écritures de ``save_invoice``. Quand ``ANALYTICS_SNAPSHOT`` est activé dans
+la config, les routes d'analyse lisent une copie de la base :
+
+- la copie est faite en une seule étape avec l'API de sauvegarde en ligne de
+  SQLite, puis remplace l'ancienne de façon atomique (``os.replace``). La base
+  principale étant en journal WAL (voir ``src/main.py``), la transaction de
+  lecture de la copie ne bloque pas les écritures, et celles-ci ne la font pas
+  recommencer comme le ferait une copie par blocs de pages ;
+- elle est rafraîchie en arrière-plan dès qu'elle a plus de
+  ``ANALYTICS_SNAPSHOT_INTERVAL`` secondes, la requête qui le constate étant
+  servie par la copie existante. Un verrou de fichier évite que plusieurs
+  workers la refassent en même temps ;
+- chaque réponse indique l'âge de la copie (en-têtes ``X-Analytics-Snapshot-*``).
+
+``flask --app src.main refresh-analytics-snapshot`` la rafraîchit à la demande
+(par exemple depuis cron).
+"""
+import fcntl
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+from flask import current_app, g
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import NullPool
+
+from src.models.user import db
+
+DEFAULT_INTERVAL = 300
+
+_refreshing = threading.Lock()
+
+
+def is_enabled():
+    return bool(current_app.config.get('ANALYTICS_SNAPSHOT'))
+
+
+def source_path():
+    """Chemin du fichier SQLite de la base principale"""
+    return db.engine.url.database
+
+
+def snapshot_path():
+    path = current_app.config.get('ANALYTICS_SNAPSHOT_PATH')
+    if path:
+        return path
+    base, _ = os.path.splitext(source_path())
+    return f"{base}-analytics.db"
+
+
+def snapshot_age(path=None):
+    """Âge de la copie en secondes (None si elle n'existe pas encore)"""
+    path = path or snapshot_path()
+    if not os.path.exists(path):
+        return None
+    return max(0.0, time.time() - os.path.getmtime(path))
+
+
+def refresh_snapshot(source, target):
+    """Copie la base ``source`` vers ``target`` avec l'API de sauvegarde de SQLite.
+
+    Retourne False sans rien faire si un autre processus rafraîchit déjà la copie.
+    """
+    lock_file = open(f"{target}.lock", 'w')
+    try:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(target)), suffix='.db')
+        os.close(fd)
+        try:
+            # Pas de mode=ro : une base WAL sans fichier -shm ne s'ouvrirait pas en lecture seule
+            source_conn = sqlite3.connect(source)
+            target_conn = sqlite3.connect(tmp_path)
+            try:
+                source_conn.backup(target_conn)
+                # La copie est ouverte en lecture seule par les rapports : journal classique, sans -wal ni -shm
+                target_conn.execute('PRAGMA journal_mode=DELETE')
+            finally:
+                target_conn.close()
+                source_conn.close()
+            # Les lecteurs déjà ouverts finissent sur l'ancienne copie, les suivants ouvrent la nouvelle
+            os.replace(tmp_path, target)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return True
+    finally:
+        lock_file.close()
+
+
+def _refresh_in_background(source, target):
+    def run():
+        try:
+            refresh_snapshot(source, target)
+        finally:
+            _refreshing.release()
+
+    # Un seul rafraîchissement à la fois dans ce processus
+    if _refreshing.acquire(blocking=False):
+        threading.Thread(target=run, name='analytics-snapshot', daemon=True).start()
+
+
+def _engine(path):
+    engines = current_app.extensions.setdefault('analytics_snapshot_engines', {})
+    if path not in engines:
+        # Sans pool : chaque session rouvre le fichier, et voit donc la dernière copie
+        engines[path] = create_engine(f"sqlite:///file:{path}?mode=ro&uri=true", poolclass=NullPool)
+    return engines[path]
+
+
+def analytics_session():
+    """Session à utiliser par les routes d'analyse.
+
+    Sans snapshot configuré, c'est la session principale. Sinon, une session en
+    lecture seule sur la copie, rafraîchie si elle est trop ancienne (la toute
+    première copie est faite pendant la requête).
+    """
+    if not is_enabled():
+        return db.session
+    if 'analytics_session' in g:
+        return g.analytics_session
+
+    path = snapshot_path()
+    age = snapshot_age(path)
+    if age is None:
+        if not refresh_snapshot(source_path(), path):
+            # Première copie en cours dans un autre worker : lecture sur la base principale en attendant
+            return db.session
+    elif age > current_app.config.get('ANALYTICS_SNAPSHOT_INTERVAL', DEFAULT_INTERVAL):
+        _refresh_in_background(source_path(), path)
+
+    g.analytics_session = Session(bind=_engine(path))
+    g.analytics_snapshot_path = path
+    return g.analytics_session
+
+
+def add_snapshot_headers(response):
+    """Indique la date et l'âge de la copie lue (hook after_request des routes d'analyse)"""
+    path = g.get('analytics_snapshot_path')
+    if path and os.path.exists(path):
+        taken_at = os.path.getmtime(path)
+        response.headers['X-Analytics-Snapshot-Taken-At'] = \
+            datetime.fromtimestamp(taken_at, timezone.utc).isoformat(timespec='seconds')
+        response.headers['X-Analytics-Snapshot-Age'] = f"{max(0.0, time.time() - taken_at):.1f}"
+    return response
+
+
+def _close_session(exception=None):
+    session = g.pop('analytics_session', None)
+    if session is not None:
+        session.close()
+
+
+def init_app(app):
+    """Ferme les sessions sur la copie en fin de requête et ajoute la commande de rafraîchissement"""
+    app.teardown_appcontext(_close_session)
+
+    @app.cli.command('refresh-analytics-snapshot')
+    def refresh_analytics_snapshot_command():
+        """Rafraîchit la copie de la base lue par les rapports d'analyse"""
+        started = time.perf_counter()
+        if refresh_snapshot(source_path(), snapshot_path()):
+            print(f"Snapshot rafraîchi en {time.perf_counter() - started:.2f}s : {snapshot_path()}")
+        else:
+            print("Un rafraîchissement est déjà en cours")
@@ -0,0 +1,183 @@
+"""Stockage adressé par contenu des fichiers de factures uploadés.
+
+Chaque fichier est écrit par blocs sur le disque tout en étant haché (SHA-256),
+puis rangé sous un chemin réparti sur deux niveaux de sous-dossiers :
+
+    <UPLOAD_FOLDER>/objects/ab/cd/abcdef...0123.pdf
+
+La référence enregistrée dans ``Invoice.file_path`` est le chemin relatif
+``ab/cd/abcdef...0123.pdf`` : elle ne dépend ni du nom d'origine du fichier ni
+du dossier d'upload, et deux uploads identiques partagent le même objet.
+
+Les objets anciens peuvent être recompressés (``compress_old_objects``) : ils
+sont alors stockés sous ``<référence>.gz`` et décompressés à la demande dans un
+cache, la référence restant inchangée.
+"""
+import gzip
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+
+from flask import current_app
+
+CHUNK_SIZE = 64 * 1024
+OBJECTS_DIR = 'objects'
+CACHE_DIR = 'cache'
+COMPRESSED_SUFFIX = '.gz'
+
+# Les formats déjà compressés ne gagnent presque rien à être regzippés
+ALREADY_COMPRESSED_EXTENSIONS = {'jpg', 'jpeg', 'gif'}
+
+
+def get_upload_folder():
+    """Retourne le dossier racine du stockage des uploads"""
+    return current_app.config['UPLOAD_FOLDER']
+
+
+def _object_path(reference, root=None):
+    root = root or get_upload_folder()
+    return os.path.join(root, OBJECTS_DIR, *reference.split('/'))
+
+
+def make_reference(digest, extension):
+    """Construit la référence stable d'un objet à partir de son empreinte"""
+    return f"{digest[:2]}/{digest[2:4]}/{digest}.{extension}"
+
+
+def digest_from_reference(reference):
+    """Extrait l'empreinte SHA-256 d'une référence (None pour un chemin hérité)"""
+    name = os.path.basename(reference or '')
+    digest = name.split('.', 1)[0]
+    if len(digest) == 64 and all(c in '0123456789abcdef' for c in digest):
+        return digest
+    return None
+
+
+def find_reference(digest):
+    """Retrouve la référence d'un objet à partir de son empreinte (None si inconnu)"""
+    directory = os.path.join(get_upload_folder(), OBJECTS_DIR, digest[:2], digest[2:4])
+    if not os.path.isdir(directory):
+        return None
+    for filename in os.listdir(directory):
+        if filename.split('.', 1)[0] == digest:
+            name = filename[:-len(COMPRESSED_SUFFIX)] if filename.endswith(COMPRESSED_SUFFIX) else filename
+            return f"{digest[:2]}/{digest[2:4]}/{name}"
+    return None
+
+
+def store_upload(file_storage, extension):
+    """Enregistre un fichier uploadé par blocs en calculant son empreinte.
+
+    Retourne un tuple ``(reference, created)`` ; ``created`` vaut False si un
+    objet identique existait déjà (le fichier n'est alors pas dupliqué).
+    """
+    root = get_upload_folder()
+    tmp_dir = os.path.join(root, 'tmp')
+    os.makedirs(tmp_dir, exist_ok=True)
+
+    hasher = hashlib.sha256()
+    fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            while True:
+                chunk = file_storage.stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                hasher.update(chunk)
+                out.write(chunk)
+
+        reference = make_reference(hasher.hexdigest(), extension.lower())
+        final_path = _object_path(reference, root)
+        if os.path.exists(final_path) or os.path.exists(final_path + COMPRESSED_SUFFIX):
+            return reference, False
+
+        os.makedirs(os.path.dirname(final_path), exist_ok=True)
+        # os.replace est atomique : un lecteur concurrent ne voit jamais un fichier partiel
+        os.replace(tmp_path, final_path)
+        return reference, True
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def resolve_path(reference):
+    """Retourne un chemin local lisible pour une référence stockée.
+
+    Les objets compressés sont décompressés dans le cache ; les anciens chemins
+    (``uploads/nom.pdf``) enregistrés avant le stockage par contenu restent
+    acceptés tels quels.
+    """
+    if not reference:
+        return None
+
+    if digest_from_reference(reference) is None:
+        return reference if os.path.exists(reference) else None
+
+    path = _object_path(reference)
+    if os.path.exists(path):
+        return path
+
+    compressed_path = path + COMPRESSED_SUFFIX
+    if not os.path.exists(compressed_path):
+        return None
+
+    cache_path = os.path.join(get_upload_folder(), CACHE_DIR, os.path.basename(reference))
+    if not os.path.exists(cache_path):
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(cache_path))
+        with gzip.open(compressed_path, 'rb') as src, os.fdopen(fd, 'wb') as dst:
+            shutil.copyfileobj(src, dst, CHUNK_SIZE)
+        os.replace(tmp_path, cache_path)
+    return cache_path
+
+
+def compress_old_objects(max_age_days=90, level=9):
+    """Recompresse les objets non modifiés depuis ``max_age_days`` jours.
+
+    Retourne un dictionnaire de statistiques (fichiers traités, octets gagnés).
+    """
+    root = os.path.join(get_upload_folder(), OBJECTS_DIR)
+    cutoff = time.time() - max_age_days * 86400
+    stats = {'compressed': 0, 'skipped': 0, 'bytes_before': 0, 'bytes_after': 0}
+
+    for dirpath, _, filenames in os.walk(root):
+        for filename in filenames:
+            if filename.endswith(COMPRESSED_SUFFIX):
+                continue
+            path = os.path.join(dirpath, filename)
+            extension = filename.rsplit('.', 1)[-1].lower()
+            if extension in ALREADY_COMPRESSED_EXTENSIONS or os.path.getmtime(path) > cutoff:
+                stats['skipped'] += 1
+                continue
+
+            tmp_path = path + COMPRESSED_SUFFIX + '.tmp'
+            with open(path, 'rb') as src, gzip.open(tmp_path, 'wb', compresslevel=level) as dst:
+                shutil.copyfileobj(src, dst, CHUNK_SIZE)
+
+            size_before = os.path.getsize(path)
+            size_after = os.path.getsize(tmp_path)
+            if size_after >= size_before:
+                # Pas de gain : on garde l'original
+                os.remove(tmp_path)
+                stats['skipped'] += 1
+                continue
+
+            os.replace(tmp_path, path + COMPRESSED_SUFFIX)
+            os.remove(path)
+            stats['compressed'] += 1
+            stats['bytes_before'] += size_before
+            stats['bytes_after'] += size_after
+
+    # Les copies décompressées à la demande sont purgées avec la même ancienneté
+    cache_root = os.path.join(get_upload_folder(), CACHE_DIR)
+    stats['cache_purged'] = 0
+    if os.path.isdir(cache_root):
+        for filename in os.listdir(cache_root):
+            path = os.path.join(cache_root, filename)
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                stats['cache_purged'] += 1
+
+    return stats
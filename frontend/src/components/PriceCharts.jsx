@@ -6,6 +6,7 @@ import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from '@
 import { Button } from '@/components/ui/button'
 import { Badge } from '@/components/ui/badge'
 import { Tabs, TabsContent, TabsList, TabsTrigger } from '@/components/ui/tabs'
+import { loadCatalog } from '@/lib/catalog'
 
 const PriceCharts = ({ productId, supplierFilter }) => {
   const [priceEvolution, setPriceEvolution] = useState([])
@@ -33,13 +34,10 @@ const PriceCharts = ({ productId, supplierFilter }) => {
 
   const loadProducts = async () => {
     try {
-      const response = await fetch('/api/invoices/products')
-      if (response.ok) {
-        const data = await response.json()
-        setProducts(data)
-        if (!selectedProduct && data.length > 0) {
-          setSelectedProduct(data[0].id)
-        }
+      const data = await loadCatalog('products')
+      setProducts(data)
+      if (!selectedProduct && data.length > 0) {
+        setSelectedProduct(data[0].id)
       }
     } catch (error) {
       console.error('Erreur lors du chargement des produits:', error)
@@ -51,7 +49,9 @@ const PriceCharts = ({ productId, supplierFilter }) => {
     
     setLoading(true)
     try {
-      const url = `/api/analytics/price-evolution/${selectedProduct}?granularity=${granularity}${supplierFilter ? `&supplier_id=${supplierFilter}` : ''}`
+      // Pas plus d'un point pour 4 pixels de large : le serveur réduit la série au-delà
+      const maxPoints = Math.max(50, Math.round(window.innerWidth / 4))
+      const url = `/api/analytics/price-evolution/${selectedProduct}?granularity=${granularity}&max_points=${maxPoints}${supplierFilter ? `&supplier_id=${supplierFilter}` : ''}`
       const response = await fetch(url)
       if (response.ok) {
         const data = await response.json()
@@ -166,6 +166,8 @@ const PriceCharts = ({ productId, supplierFilter }) => {
                   <SelectValue />
                 </SelectTrigger>
                 <SelectContent>
+                  <SelectItem value="daily">Journalier</SelectItem>
+                  <SelectItem value="weekly">Hebdomadaire</SelectItem>
                   <SelectItem value="monthly">Mensuel</SelectItem>
                   <SelectItem value="quarterly">Trimestriel</SelectItem>
                   <SelectItem value="yearly">Annuel</SelectItem>
@@ -215,7 +217,7 @@ const PriceCharts = ({ productId, supplierFilter }) => {
                         stroke="#2563eb" 
                         strokeWidth={2}
                         name="Prix moyen"
-                        dot={{ fill: '#2563eb', strokeWidth: 2, r: 4 }}
+                        dot={priceEvolution.length <= 60 ? { fill: '#2563eb', strokeWidth: 2, r: 4 } : false}
                       />
                       <Line 
                         type="monotone" 
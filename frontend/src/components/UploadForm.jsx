@@ -5,10 +5,35 @@ import { Card, CardContent, CardDescription, CardHeader, CardTitle } from '@/com
 import { Alert, AlertDescription } from '@/components/ui/alert'
 import { Progress } from '@/components/ui/progress'
 
-const UploadForm = ({ onUploadSuccess }) => {
+// Lit un flux Server-Sent Events reçu par fetch (EventSource ne permet pas d'envoyer le fichier en POST)
+const readEvents = async (response, onEvent) => {
+  const reader = response.body.getReader()
+  const decoder = new TextDecoder()
+  let buffer = ''
+  while (true) {
+    const { done, value } = await reader.read()
+    if (done) break
+    buffer += decoder.decode(value, { stream: true })
+    let boundary
+    while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+      const block = buffer.slice(0, boundary)
+      buffer = buffer.slice(boundary + 2)
+      let event = 'message'
+      let data = ''
+      for (const line of block.split('\n')) {
+        if (line.startsWith('event: ')) event = line.slice(7)
+        else if (line.startsWith('data: ')) data += line.slice(6)
+      }
+      if (data) onEvent(event, JSON.parse(data))
+    }
+  }
+}
+
+const UploadForm = ({ onUploadSuccess, onUploadProgress }) => {
   const [isDragging, setIsDragging] = useState(false)
   const [isUploading, setIsUploading] = useState(false)
   const [uploadProgress, setUploadProgress] = useState(0)
+  const [pageProgress, setPageProgress] = useState(null)
   const [error, setError] = useState(null)
   const [success, setSuccess] = useState(null)
 
@@ -56,36 +81,68 @@ const UploadForm = ({ onUploadSuccess }) => {
     setSuccess(null)
     setIsUploading(true)
     setUploadProgress(0)
+    setPageProgress(null)
 
     const formData = new FormData()
     formData.append('file', file)
 
     try {
-      // Simulation du progrès d'upload
-      const progressInterval = setInterval(() => {
-        setUploadProgress(prev => {
-          if (prev >= 90) {
-            clearInterval(progressInterval)
-            return 90
-          }
-          return prev + 10
-        })
-      }, 200)
-
-      const response = await fetch('/api/invoices/upload', {
+      // Traitement en flux : chaque page arrive dès la fin de son OCR
+      const response = await fetch('/api/invoices/upload/stream', {
         method: 'POST',
         body: formData,
       })
 
-      clearInterval(progressInterval)
-      setUploadProgress(100)
-
       if (!response.ok) {
         const errorData = await response.json()
         throw new Error(errorData.error || 'Erreur lors de l\'upload')
       }
 
-      const result = await response.json()
+      let partial = null
+      let result = null
+      await readEvents(response, (event, data) => {
+        if (event === 'start') {
+          partial = {
+            ...data,
+            partial: true,
+            extracted_text: '',
+            ocr_stats: null,
+            global_confidence: 0,
+            parsed_data: { invoice_number: '', invoice_date: '', supplier_name: '', total_amount: 0, lines: [] }
+          }
+          setUploadProgress(10)
+        } else if (event === 'supplier') {
+          partial.parsed_data.supplier_name = data.supplier_name || ''
+        } else if (event === 'page') {
+          partial = {
+            ...partial,
+            pages_done: data.pages_done,
+            parsed_data: {
+              ...partial.parsed_data,
+              invoice_number: data.invoice_number,
+              invoice_date: data.invoice_date,
+              total_amount: data.total_amount,
+              lines: [...partial.parsed_data.lines, ...data.lines]
+            }
+          }
+          setPageProgress({ done: data.pages_done, count: data.page_count })
+          setUploadProgress(10 + Math.round(90 * data.pages_done / Math.max(data.page_count, 1)))
+          // Les premières pages peuvent être validées pendant l'OCR des suivantes
+          if (onUploadProgress) {
+            onUploadProgress(partial)
+          }
+        } else if (event === 'complete') {
+          result = data
+        } else if (event === 'error') {
+          throw new Error(data.error)
+        }
+      })
+
+      if (!result) {
+        throw new Error('Traitement interrompu')
+      }
+      setUploadProgress(100)
+
       setSuccess(`Facture "${file.name}" traitée avec succès. Confiance globale: ${Math.round(result.global_confidence * 100)}%`)
       
       // Appeler le callback avec les données extraites
@@ -131,7 +188,9 @@ const UploadForm = ({ onUploadSuccess }) => {
               <div className="animate-spin mx-auto h-8 w-8 border-2 border-blue-500 border-t-transparent rounded-full"></div>
               <p className="text-sm text-gray-600">Traitement en cours...</p>
               <Progress value={uploadProgress} className="w-full" />
-              <p className="text-xs text-gray-500">{uploadProgress}%</p>
+              <p className="text-xs text-gray-500">
+                {pageProgress ? `Page ${pageProgress.done} / ${pageProgress.count} — ` : ''}{uploadProgress}%
+              </p>
             </div>
           ) : (
             <>
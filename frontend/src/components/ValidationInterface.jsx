@@ -1,4 +1,4 @@
-import { useState, useEffect } from 'react'
+import { useState, useEffect, useRef } from 'react'
 import { Check, X, AlertTriangle, Plus, Edit, Search } from 'lucide-react'
 import { Button } from '@/components/ui/button'
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from '@/components/ui/card'
@@ -9,6 +9,35 @@ import { Textarea } from '@/components/ui/textarea'
 import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from '@/components/ui/select'
 import { Dialog, DialogContent, DialogDescription, DialogHeader, DialogTitle, DialogTrigger } from '@/components/ui/dialog'
 import { Alert, AlertDescription } from '@/components/ui/alert'
+import { loadCatalog } from '@/lib/catalog'
+
+// Date lue par l'OCR (JJ/MM/AAAA) au format du champ date, aujourd'hui si absente
+const toDateInput = (value) => {
+  const match = /^(\d{1,2})[/.-](\d{1,2})[/.-](\d{2,4})$/.exec(value || '')
+  if (!match) {
+    return new Date().toISOString().split('T')[0]
+  }
+  const year = match[3].length === 2 ? `20${match[3]}` : match[3]
+  return `${year}-${match[2].padStart(2, '0')}-${match[1].padStart(2, '0')}`
+}
+
+// Champs d'en-tête proposés par l'OCR
+const headerFields = (parsedData) => ({
+  invoice_number: parsedData.invoice_number || '',
+  invoice_date: toDateInput(parsedData.invoice_date),
+  supplier_name: parsedData.supplier_name || '',
+  total_amount: parsedData.total_amount || 0
+})
+
+// Position du pointeur relative à l'image (0-1), comme l'attend la relecture de zone
+const relativePosition = (event) => {
+  const rect = event.currentTarget.getBoundingClientRect()
+  const clamp = (value) => Math.min(1, Math.max(0, value))
+  return {
+    x: clamp((event.clientX - rect.left) / rect.width),
+    y: clamp((event.clientY - rect.top) / rect.height)
+  }
+}
 
 const ValidationInterface = ({ invoiceData, onValidationComplete }) => {
   const [validationData, setValidationData] = useState(null)
@@ -18,30 +47,64 @@ const ValidationInterface = ({ invoiceData, onValidationComplete }) => {
   const [isNewProductDialogOpen, setIsNewProductDialogOpen] = useState(false)
   const [newProduct, setNewProduct] = useState({ name: '', category: '', unit: '' })
   const [isSaving, setIsSaving] = useState(false)
+  // Upload affiché et derniers champs d'en-tête reçus de l'OCR
+  const upload = useRef({ id: null, fields: null })
+  // Aperçu : page affichée et zone sélectionnée (coordonnées relatives)
+  const [previewPage, setPreviewPage] = useState(1)
+  const [selection, setSelection] = useState(null)
+  const [isReading, setIsReading] = useState(false)
+  const dragStart = useRef(null)
 
   useEffect(() => {
     if (invoiceData) {
+      const lines = invoiceData.parsed_data.lines.map(line => ({
+        ...line,
+        validation_status: line.ocr_confidence > 0.7 ? 'validated' : 'pending',
+        product_id: null,
+        quantity: line.quantity || 1,
+        unit_price: line.unit_price || (line.total_price || 0),
+        new_product_name: '',
+        new_product_category: '',
+        new_product_unit: ''
+      }))
+
+      const fields = headerFields(invoiceData.parsed_data)
+
+      // Upload en flux : les événements suivants du même upload complètent les données. Un champ
+      // d'en-tête prend la nouvelle valeur de l'OCR tant que l'utilisateur ne l'a pas corrigé
+      if (validationData && invoiceData.upload_id && invoiceData.upload_id === upload.current.id) {
+        const previous = upload.current.fields
+        upload.current.fields = fields
+        setValidationData(prev => {
+          const updated = {
+            ...prev,
+            global_confidence: invoiceData.global_confidence || prev.global_confidence,
+            ocr_stats: invoiceData.ocr_stats || prev.ocr_stats,
+            extracted_text: invoiceData.extracted_text || prev.extracted_text,
+            lines: [...prev.lines, ...lines.slice(prev.lines.length)]
+          }
+          Object.entries(fields).forEach(([name, value]) => {
+            if (prev[name] === previous[name]) {
+              updated[name] = value
+            }
+          })
+          return updated
+        })
+        return
+      }
+
       // Initialiser les données de validation
+      upload.current = { id: invoiceData.upload_id || null, fields }
+      setPreviewPage(1)
+      setSelection(null)
       const initialData = {
-        invoice_number: invoiceData.parsed_data.invoice_number || '',
-        invoice_date: invoiceData.parsed_data.date ? 
-          new Date(invoiceData.parsed_data.date).toISOString().split('T')[0] : 
-          new Date().toISOString().split('T')[0],
-        supplier_name: invoiceData.parsed_data.supplier_name || '',
-        total_amount: invoiceData.parsed_data.total_amount || 0,
+        ...fields,
         currency: 'EUR',
         global_confidence: invoiceData.global_confidence || 0,
         file_path: invoiceData.file_path || '',
-        lines: invoiceData.parsed_data.lines.map(line => ({
-          ...line,
-          validation_status: line.ocr_confidence > 0.7 ? 'validated' : 'pending',
-          product_id: null,
-          quantity: line.quantity || 1,
-          unit_price: line.unit_price || (line.total_price || 0),
-          new_product_name: '',
-          new_product_category: '',
-          new_product_unit: ''
-        }))
+        ocr_stats: invoiceData.ocr_stats || null,
+        extracted_text: invoiceData.extracted_text || '',
+        lines
       }
       setValidationData(initialData)
       
@@ -53,11 +116,7 @@ const ValidationInterface = ({ invoiceData, onValidationComplete }) => {
 
   const loadProducts = async () => {
     try {
-      const response = await fetch('/api/invoices/products')
-      if (response.ok) {
-        const data = await response.json()
-        setProducts(data)
-      }
+      setProducts(await loadCatalog('products'))
     } catch (error) {
       console.error('Erreur lors du chargement des produits:', error)
     }
@@ -65,11 +124,7 @@ const ValidationInterface = ({ invoiceData, onValidationComplete }) => {
 
   const loadSuppliers = async () => {
     try {
-      const response = await fetch('/api/invoices/suppliers')
-      if (response.ok) {
-        const data = await response.json()
-        setSuppliers(data)
-      }
+      setSuppliers(await loadCatalog('suppliers'))
     } catch (error) {
       console.error('Erreur lors du chargement des fournisseurs:', error)
     }
@@ -104,6 +159,65 @@ const ValidationInterface = ({ invoiceData, onValidationComplete }) => {
     }
   }
 
+  const startSelection = (event) => {
+    event.currentTarget.setPointerCapture(event.pointerId)
+    dragStart.current = relativePosition(event)
+    setSelection({ ...dragStart.current, width: 0, height: 0 })
+  }
+
+  const extendSelection = (event) => {
+    if (!dragStart.current) return
+    const start = dragStart.current
+    const position = relativePosition(event)
+    setSelection({
+      x: Math.min(start.x, position.x),
+      y: Math.min(start.y, position.y),
+      width: Math.abs(position.x - start.x),
+      height: Math.abs(position.y - start.y)
+    })
+  }
+
+  const endSelection = () => {
+    dragStart.current = null
+  }
+
+  // Relit la zone sélectionnée et en remplit la ligne en cours de validation
+  const reocrSelection = async () => {
+    setIsReading(true)
+    try {
+      const response = await fetch(`/api/invoices/files/${invoiceData.file_id}/pages/${previewPage}/ocr`, {
+        method: 'POST',
+        headers: {
+          'Content-Type': 'application/json',
+        },
+        body: JSON.stringify(selection),
+      })
+
+      const result = await response.json()
+      if (!response.ok) {
+        throw new Error(result.error || 'Erreur lors de la relecture')
+      }
+      const parsed = result.parsed_line
+      setValidationData(prev => ({
+        ...prev,
+        lines: prev.lines.map((line, i) =>
+          i === currentLineIndex ? {
+            ...line,
+            raw_description: parsed ? parsed.raw_description : result.text.trim(),
+            ...(parsed && { unit_price: parsed.unit_price, total_price: parsed.total_price }),
+            ocr_confidence: result.confidence
+          } : line
+        )
+      }))
+      setSelection(null)
+    } catch (error) {
+      console.error('Erreur lors de la relecture de la zone:', error)
+      alert('Erreur lors de la relecture: ' + error.message)
+    } finally {
+      setIsReading(false)
+    }
+  }
+
   const createNewProduct = async () => {
     try {
       const response = await fetch('/api/invoices/products', {
@@ -161,6 +275,9 @@ const ValidationInterface = ({ invoiceData, onValidationComplete }) => {
   const currentLine = validationData.lines[currentLineIndex]
   const pendingLines = validationData.lines.filter(line => line.validation_status === 'pending')
   const confidenceLevel = getConfidenceLevel(currentLine?.ocr_confidence || 0)
+  // Les pages ne sont servies qu'une fois le document entièrement rastérisé
+  const pages = invoiceData.partial ? [] : (invoiceData.pages || [])
+  const hasSelection = selection && selection.width > 0.005 && selection.height > 0.005
 
   return (
     <div className="space-y-6">
@@ -198,6 +315,70 @@ const ValidationInterface = ({ invoiceData, onValidationComplete }) => {
         </CardContent>
       </Card>
 
+      {/* Aperçu du document et relecture d'une zone */}
+      {invoiceData.file_id && (
+        <Card>
+          <CardHeader>
+            <CardTitle>Document</CardTitle>
+            <CardDescription>
+              {pages.length > 0
+                ? 'Sélectionnez une zone de la page pour la relire dans la ligne en cours'
+                : 'Aperçu disponible à la fin du traitement'}
+            </CardDescription>
+          </CardHeader>
+          {pages.length > 0 && (
+            <CardContent className="space-y-4">
+              {pages.length > 1 && (
+                <div className="flex gap-2 overflow-x-auto">
+                  {pages.map(page => (
+                    <button
+                      key={page.page}
+                      type="button"
+                      onClick={() => { setPreviewPage(page.page); setSelection(null) }}
+                      className={`shrink-0 border-2 rounded ${page.page === previewPage ? 'border-blue-600' : 'border-transparent'}`}
+                    >
+                      <img src={page.thumbnail_url} alt={`Page ${page.page}`} className="h-24" />
+                    </button>
+                  ))}
+                </div>
+              )}
+              <div
+                className="relative select-none cursor-crosshair touch-none"
+                onPointerDown={startSelection}
+                onPointerMove={extendSelection}
+                onPointerUp={endSelection}
+              >
+                <img
+                  src={pages.find(page => page.page === previewPage)?.image_url}
+                  alt={`Page ${previewPage}`}
+                  className="w-full border rounded"
+                  draggable={false}
+                />
+                {selection && (
+                  <div
+                    className="absolute border-2 border-blue-600 bg-blue-600/10 pointer-events-none"
+                    style={{
+                      left: `${selection.x * 100}%`,
+                      top: `${selection.y * 100}%`,
+                      width: `${selection.width * 100}%`,
+                      height: `${selection.height * 100}%`
+                    }}
+                  ></div>
+                )}
+              </div>
+              <Button
+                variant="outline"
+                onClick={reocrSelection}
+                disabled={!hasSelection || !currentLine || isReading}
+              >
+                <Search className="h-4 w-4 mr-2" />
+                {isReading ? 'Relecture...' : `Relire la zone dans la ligne ${currentLineIndex + 1}`}
+              </Button>
+            </CardContent>
+          )}
+        </Card>
+      )}
+
       {/* Progression de validation */}
       <Card>
         <CardHeader>
@@ -426,7 +607,7 @@ const ValidationInterface = ({ invoiceData, onValidationComplete }) => {
       <div className="flex justify-end">
         <Button
           onClick={saveInvoice}
-          disabled={pendingLines.length > 0 || isSaving}
+          disabled={pendingLines.length > 0 || isSaving || invoiceData.partial}
           size="lg"
         >
           {isSaving ? 'Sauvegarde...' : 'Sauvegarder la facture'}
@@ -0,0 +1,49 @@
+// Copie locale des catalogues (produits, fournisseurs), tenue à jour par différence :
+// l'ETag évite de retransférer un catalogue inchangé (304), ?since= ne renvoie que les lignes modifiées
+const STORAGE_PREFIX = 'catalog:'
+
+const readCache = (name) => {
+  try {
+    return JSON.parse(localStorage.getItem(STORAGE_PREFIX + name))
+  } catch {
+    return null
+  }
+}
+
+const writeCache = (name, cache) => {
+  try {
+    localStorage.setItem(STORAGE_PREFIX + name, JSON.stringify(cache))
+  } catch {
+    // Quota dépassé : le catalogue sera rechargé en entier la prochaine fois
+    localStorage.removeItem(STORAGE_PREFIX + name)
+  }
+}
+
+const lastUpdate = (items) =>
+  items.reduce((latest, item) => (item.updated_at && item.updated_at > latest ? item.updated_at : latest), '')
+
+// name : 'products' ou 'suppliers'
+export async function loadCatalog(name) {
+  const url = `/api/invoices/${name}`
+  const cache = readCache(name)
+  const since = cache ? lastUpdate(cache.items) : ''
+
+  const response = await fetch(since ? `${url}?since=${encodeURIComponent(since)}` : url, {
+    headers: cache?.etag ? { 'If-None-Match': cache.etag } : {},
+    cache: 'no-store',
+  })
+  if (response.status === 304) {
+    return cache.items
+  }
+  if (!response.ok) {
+    throw new Error(`Erreur lors du chargement du catalogue ${name}`)
+  }
+
+  // Lignes nouvelles ou modifiées fusionnées par id avec la copie locale
+  const changed = await response.json()
+  const byId = new Map(since ? cache.items.map(item => [item.id, item]) : [])
+  changed.forEach(item => byId.set(item.id, item))
+  const items = [...byId.values()].sort((a, b) => a.id - b.id)
+  writeCache(name, { etag: response.headers.get('ETag'), items })
+  return items
+}